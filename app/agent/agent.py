@@ -9,7 +9,8 @@ from datetime import datetime
 from app.configs.settings import settings
 from app.memory.redis_memory import get_redis_memory
 
-from .tools import get_tools
+from .executor import ParallelAgentExecutor
+from .tools import MCPToolRegistry, tool_registry
 from .prompt import tamplate
 
 
@@ -19,11 +20,28 @@ llm = ChatMistralAI(
 )
 
 
-
-async def get_agent():
-    tools = await get_tools()
+def build_executor(tools, tool_timeouts: dict[str, float] | None = None) -> ParallelAgentExecutor:
+    """Агент без памяти: историю, если нужна, передают во входе `history`."""
     agent = create_tool_calling_agent(llm, tools, tamplate)
-    agent_exec = AgentExecutor.from_agent_and_tools(agent, tools)
+    return ParallelAgentExecutor.from_agent_and_tools(
+        agent,
+        tools,
+        max_parallel_tools=settings.agent_max_parallel_tools,
+        tool_timeouts=tool_timeouts or {},
+        return_intermediate_steps=True,
+        default_tool_timeout=max(
+            settings.mcp_calendar.mcp_request_timeout_sec,
+            settings.mcp_mail.mcp_request_timeout_sec,
+            settings.mcp_sheet.mcp_request_timeout_sec,
+        ),
+    )
+
+
+def build_agent(tools, tool_timeouts: dict[str, float] | None = None) -> RunnableWithMessageHistory:
+    return with_history(build_executor(tools, tool_timeouts))
+
+
+def with_history(agent_exec: ParallelAgentExecutor) -> RunnableWithMessageHistory:
     agent_with_history = RunnableWithMessageHistory(
         agent_exec,
         get_redis_memory,
@@ -32,3 +50,61 @@ async def get_agent():
         output_messages_key="output"
     )
     return agent_with_history
+
+
+class AgentHolder:
+    """
+    Один агент на процесс.
+
+    Пересобирается только когда реестр MCP инструментов меняет их набор.
+    """
+
+    def __init__(self, registry: MCPToolRegistry):
+        self.registry = registry
+        self._agent: RunnableWithMessageHistory | None = None
+        self._executor: ParallelAgentExecutor | None = None
+        self._version = -1
+
+    async def start(self) -> None:
+        await self.registry.start()
+
+    async def stop(self) -> None:
+        await self.registry.stop()
+
+    async def _ensure(self) -> None:
+        if not self.registry.started:
+            await self.registry.start()
+        if self._agent is None or self._version != self.registry.version:
+            self._version = self.registry.version
+            tools = self.registry.tools()
+            self._executor = build_executor(tools, self.tool_timeouts(tools))
+            self._agent = with_history(self._executor)
+
+    async def get(self) -> RunnableWithMessageHistory:
+        await self._ensure()
+        return self._agent
+
+    async def get_executor(self) -> ParallelAgentExecutor:
+        """Тот же агент без истории чата."""
+        await self._ensure()
+        return self._executor
+
+    def tool_timeouts(self, tools) -> dict[str, float]:
+        """Таймаут инструмента — mcp_request_timeout_sec его сервера."""
+        timeouts = {}
+        for tool in tools:
+            server = self.registry.server_of(tool.name)
+            if server is not None:
+                timeouts[tool.name] = getattr(settings, f"mcp_{server}").mcp_request_timeout_sec
+        return timeouts
+
+
+agent_holder = AgentHolder(tool_registry)
+
+
+async def get_agent():
+    return await agent_holder.get()
+
+
+async def get_standalone_agent():
+    return await agent_holder.get_executor()
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import time
+
+import numpy as np
+import redis
+
+from app.configs.settings import settings
+from app.memory.pool import get_redis
+from app.vectordb.cache import generations, normalize_query, record_hit
+from app.vectordb.store import vector_service
+
+from .executor import ToolFailure
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Кеш готовых ответов на вопросы к базе знаний.
+
+    Ответ сохраняется, только если за ход агент вызывал лишь `knowledge_base_search`,
+    каждый вызов отработал и что-то нашел: ответы с календарем, почтой и таблицами
+    зависят от пользователя и времени, а ответ без найденного контекста кешировать незачем.
+    Кеш общий для всех чатов, поэтому в него кладутся только ответы, полученные
+    без истории чата, — иначе другой пользователь увидел бы ответ, сложившийся
+    из чужой переписки. Для хода в чате с историей вызывающий получает такой ответ
+    отдельным запуском агента без памяти.
+
+    В ключ входит поколение коллекции, поэтому после загрузки документов старые
+    ответы становятся недостижимы и удаляются по TTL. При `similarity` > 0 вопрос
+    дополнительно сравнивается по эмбеддингу с уже закешированными; векторы
+    держатся в памяти процесса и перечитываются из Redis раз в `index_refresh_sec`.
+    """
+
+    CACHEABLE_TOOLS = frozenset({"knowledge_base_search"})
+
+    def __init__(
+        self,
+        collection: str,
+        enabled: bool,
+        ttl: int,
+        similarity: float = 0.0,
+        max_entries: int = 500,
+        index_refresh_sec: float = 30,
+    ):
+        self.collection = collection
+        self.enabled = enabled and bool(settings.redis_url)
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.index_refresh_sec = index_refresh_sec
+        # префикс поколения: (когда прочитан, дайджесты, нормированные векторы)
+        self._index: dict[str, tuple[float, list[str], np.ndarray | None]] = {}
+
+    @classmethod
+    def cacheable(cls, steps: list) -> bool:
+        """`steps` — intermediate_steps агента: пары (действие, результат)."""
+        return bool(steps) and all(
+            action.tool in cls.CACHEABLE_TOOLS
+            and not isinstance(observation, ToolFailure)
+            and bool(str(observation).strip())
+            for action, observation in steps
+        )
+
+    async def _prefix(self) -> str:
+        generation = await generations.current(self.collection)
+        return f"answer:{self.collection}:{generation}"
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    async def get(self, question: str) -> str | None:
+        if not self.enabled:
+            return None
+        text = normalize_query(question)
+        if not text:
+            return None
+        try:
+            prefix = await self._prefix()
+            answer = await get_redis().get(f"{prefix}:{self._digest(text)}")
+            if answer is None and self.similarity:
+                answer = await self._similar(prefix, text)
+        except redis.RedisError as e:
+            logger.warning("Answer cache lookup failed: %s", e)
+            answer = None
+        record_hit("agent.answer_cache", answer is not None)
+        return answer.decode() if answer is not None else None
+
+    async def _vectors(self, prefix: str) -> tuple[list[str], np.ndarray | None]:
+        cached = self._index.get(prefix)
+        if cached is not None and time.monotonic() - cached[0] < self.index_refresh_sec:
+            return cached[1], cached[2]
+        stored = await get_redis().hgetall(f"{prefix}:vectors")
+        digests = [digest.decode() for digest in stored]
+        matrix = None
+        if stored:
+            matrix = np.stack([np.frombuffer(value, dtype=np.float32) for value in stored.values()])
+            matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9)
+        # индексы прошлых поколений больше не понадобятся
+        self._index = {prefix: (time.monotonic(), digests, matrix)}
+        return digests, matrix
+
+    async def _similar(self, prefix: str, text: str) -> bytes | None:
+        digests, matrix = await self._vectors(prefix)
+        if matrix is None:
+            return None
+        vector = np.asarray(await vector_service.aembed_cached(text), dtype=np.float32)
+        scores = matrix @ (vector / (np.linalg.norm(vector) + 1e-9))
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return await get_redis().get(f"{prefix}:{digests[best]}")
+
+    async def set(self, question: str, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        text = normalize_query(question)
+        if not text:
+            return
+        digest = self._digest(text)
+        try:
+            prefix = await self._prefix()
+            client = get_redis()
+            await client.set(f"{prefix}:{digest}", answer, ex=self.ttl)
+            if self.similarity and await client.hlen(f"{prefix}:vectors") < self.max_entries:
+                vector = np.asarray(await vector_service.aembed_cached(text), dtype=np.float32)
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.hset(f"{prefix}:vectors", digest, vector.tobytes())
+                    pipe.expire(f"{prefix}:vectors", self.ttl)
+                    await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Answer cache store failed: %s", e)
+
+
+answer_cache = AnswerCache(
+    settings.collection_name,
+    enabled=settings.answer_cache_enabled,
+    ttl=settings.answer_cache_ttl_sec,
+    similarity=settings.answer_cache_similarity,
+    max_entries=settings.answer_cache_max_entries,
+)
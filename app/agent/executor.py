@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from uuid import UUID
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from pydantic import Field, PrivateAttr
+
+from app.utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class ToolFailure(str):
+    """Результат упавшего или не ответившего вовремя инструмента; для агента — обычный текст."""
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor для параллельных вызовов инструментов одного шага.
+
+    Базовый класс в асинхронном режиме уже запускает вызовы шага через asyncio.gather,
+    но без ограничений: здесь добавлены лимит одновременных вызовов на запуск,
+    таймаут на каждый инструмент и изоляция ошибок — упавший или зависший вызов
+    возвращает агенту текст ошибки, а соседние вызовы доводятся до конца.
+    """
+
+    max_parallel_tools: int = 4
+    tool_timeouts: dict[str, float] = Field(default_factory=dict)
+    default_tool_timeout: float = 30
+
+    _step_limits: dict = PrivateAttr(default_factory=dict)
+
+    @asynccontextmanager
+    async def _step_slot(self, run_id: UUID | None):
+        # шаги одного запуска идут последовательно, поэтому семафор на запуск — это лимит на шаг
+        if run_id is None:
+            yield
+            return
+        entry = self._step_limits.setdefault(run_id, [asyncio.Semaphore(self.max_parallel_tools), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._step_limits.pop(run_id, None)
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        agent_action: AgentAction,
+        run_manager=None,
+    ) -> AgentStep:
+        tool = agent_action.tool
+        timeout = self.tool_timeouts.get(tool, self.default_tool_timeout)
+        run_id = run_manager.run_id if run_manager else None
+        status = "ok"
+        observation = None
+
+        async with self._step_slot(run_id):
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(
+                    super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                status = "timeout"
+                observation = ToolFailure(f"Tool {tool} did not answer in {timeout:g} seconds")
+            except Exception as e:
+                status = "error"
+                observation = ToolFailure(f"Tool {tool} failed: {e}")
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.histogram(f"agent.tool.{tool}.sec").observe(elapsed)
+                if status != "ok":
+                    metrics.counter(f"agent.tool.{tool}.{status}").inc()
+                logger.info(
+                    "tool call %s %s in %.2fs",
+                    tool, status, elapsed,
+                    extra={"tool": tool, "status": status, "elapsed": elapsed, "run_id": str(run_id)},
+                )
+
+        return AgentStep(action=agent_action, observation=observation)
@@ -16,3 +16,9 @@ tamplate = ChatPromptTemplate.from_messages([
     MessagesPlaceholder("agent_scratchpad"),
 ])
 
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You maintain a running summary of a conversation between a user and an assistant. "
+               "Merge the new messages into the existing summary. Keep names, dates, numbers and "
+               "open requests, drop small talk. Answer with the updated summary only, in the language of the conversation."),
+    ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}"),
+])
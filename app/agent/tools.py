@@ -1,38 +1,44 @@
+import asyncio
+import json
+import logging
+
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.sessions import StreamableHttpConnection
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langchain_core.tools import BaseTool
 from langchain.tools import Tool
 
-from app.vectordb.store import get_store
+from app.vectordb.store import get_store, vector_service
+from app.vectordb.context import assemble_context
 from app.configs.settings import settings
 
 
-from app.configs.settings import settings
+logger = logging.getLogger(__name__)
+
+
+def get_mcp_connections() -> dict[str, StreamableHttpConnection]:
+    return {
+        "calendar": StreamableHttpConnection(
+                transport=settings.mcp_calendar.transport,
+                url=settings.mcp_calendar.url,
+                timeout=settings.mcp_calendar.mcp_request_timeout_sec
+            ),
+        "mail": StreamableHttpConnection(
+                transport=settings.mcp_mail.transport,
+                url=settings.mcp_mail.url,
+                timeout=settings.mcp_mail.mcp_request_timeout_sec
+            ),
+        "sheet": StreamableHttpConnection(
+                transport=settings.mcp_sheet.transport,
+                url=settings.mcp_sheet.url,
+                timeout=settings.mcp_sheet.mcp_request_timeout_sec
+            ),
+    }
 
 
 def get_mcp_client():
-    client = MultiServerMCPClient(
-        {
-            "calendar": StreamableHttpConnection(
-                    transport=settings.mcp_calendar.transport,
-                    url=settings.mcp_calendar.url,
-                    timeout=settings.mcp_calendar.mcp_request_timeout_sec
-                ),
-            "mail": StreamableHttpConnection(
-                    transport=settings.mcp_mail.transport,
-                    url=settings.mcp_mail.url,
-                    timeout=settings.mcp_mail.mcp_request_timeout_sec
-                ),
-            "sheet": StreamableHttpConnection(
-                    transport=settings.mcp_sheet.transport,
-                    url=settings.mcp_sheet.url,
-                    timeout=settings.mcp_sheet.mcp_request_timeout_sec
-                ),
-            
-        }
-    )
+    return MultiServerMCPClient(get_mcp_connections())
 
-    return client
 
 def rag_search(query: str) -> str:
     store = get_store(settings.collection_name)
@@ -41,14 +47,207 @@ def rag_search(query: str) -> str:
     return "\n\n".join([d.page_content for d in docs])
 
 
+async def arag_search(query: str) -> str:
+    return await assemble_context(vector_service, query, settings.collection_name)
+
+
+rag_tool = Tool(
+    name="knowledge_base_search",
+    func=rag_search,
+    coroutine=arag_search,
+    description="Useful for searching internal knowledge base for reports and documentation and cooking recipes."
+)
+
+
+def tool_signature(tool: BaseTool) -> tuple[str, str, str]:
+    """То, что видит модель: имя, описание и схема аргументов."""
+    return tool.name, tool.description, json.dumps(tool.args, sort_keys=True, default=str)
+
+
+class MCPServerSession:
+    """
+    Долгоживущая сессия с одним MCP сервером и последний известный список его инструментов.
+
+    Сессия живет в отдельной задаче: транспорт MCP держит anyio task group,
+    которую нужно открывать и закрывать в одной и той же задаче.
+    """
+
+    def __init__(self, client: MultiServerMCPClient, name: str, on_lost=None):
+        self.client = client
+        self.name = name
+        self.tools: list[BaseTool] = []
+        self._on_lost = on_lost
+        self._session = None
+        self._task: asyncio.Task | None = None
+        self._closing: asyncio.Event | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def open(self) -> list[BaseTool]:
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._run(ready), name=f"mcp-session-{self.name}")
+        try:
+            self.tools = await ready
+        except BaseException:
+            await self.close()
+            raise
+        return self.tools
+
+    async def reload(self) -> list[BaseTool]:
+        """
+        Перечитывает список инструментов в уже открытой сессии.
+
+        load_mcp_tools каждый раз создает новые объекты; если набор не изменился,
+        остаются прежние — они привязаны к той же сессии, и агента пересобирать незачем.
+        """
+        tools = await load_mcp_tools(self._session)
+        if [tool_signature(t) for t in tools] != [tool_signature(t) for t in self.tools]:
+            self.tools = tools
+        return self.tools
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=5)
+        except Exception:
+            self._task.cancel()
+        self._task = None
+        self._session = None
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with self.client.session(self.name) as session:
+                tools = await load_mcp_tools(session)
+                self._session = session
+                ready.set_result(tools)
+                await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+                return
+            logger.warning("MCP session %s lost: %s", self.name, e)
+            if self._on_lost and not self._closing.is_set():
+                self._on_lost()
+
+
+class MCPToolRegistry:
+    """
+    Кеш инструментов MCP серверов с фоновым обновлением.
+
+    Если сервер недоступен, продолжаем отдавать его последние известные инструменты
+    и повторяем попытку через `retry_interval` вместо `refresh_interval`.
+    """
+
+    def __init__(
+        self,
+        connections: dict,
+        extra_tools: list[BaseTool] | None = None,
+        refresh_interval: float = 300,
+        retry_interval: float = 15,
+        discovery_timeout: float = 30,
+    ):
+        self.client = MultiServerMCPClient(connections)
+        self.servers = {
+            name: MCPServerSession(self.client, name, on_lost=self.request_refresh)
+            for name in connections
+        }
+        self.extra_tools = extra_tools or []
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.discovery_timeout = discovery_timeout
+        self.version = 0
+        self._tools: list[BaseTool] = list(self.extra_tools)
+        self._lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def tools(self) -> list[BaseTool]:
+        return self._tools
+
+    def server_of(self, tool_name: str) -> str | None:
+        for name, server in self.servers.items():
+            if any(tool.name == tool_name for tool in server.tools):
+                return name
+        return None
+
+    def request_refresh(self) -> None:
+        self._wakeup.set()
+
+    async def refresh(self) -> bool:
+        """Обновляет инструменты всех серверов. Возвращает False, если хотя бы один недоступен."""
+        async with self._lock:
+            results = await asyncio.gather(
+                *(self._refresh_server(server) for server in self.servers.values())
+            )
+            tools = [tool for server in self.servers.values() for tool in server.tools]
+            tools.extend(self.extra_tools)
+            # новые объекты бывают, только если набор изменился или сессия переоткрыта:
+            # в обоих случаях агента нужно собрать заново
+            if [id(t) for t in tools] != [id(t) for t in self._tools]:
+                self._tools = tools
+                self.version += 1
+            return all(results)
+
+    async def _refresh_server(self, server: MCPServerSession) -> bool:
+        try:
+            if server.alive:
+                await asyncio.wait_for(server.reload(), self.discovery_timeout)
+            else:
+                await server.close()
+                await asyncio.wait_for(server.open(), self.discovery_timeout)
+            return True
+        except Exception as e:
+            logger.warning(
+                "MCP discovery failed for %s, keeping %d cached tools: %s",
+                server.name, len(server.tools), e,
+            )
+            # сессию переоткроем при следующей попытке
+            await server.close()
+            return False
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self.started:
+                return
+            healthy = await self.refresh()
+            self._task = asyncio.create_task(self._refresh_loop(healthy), name="mcp-tools-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for server in self.servers.values():
+            await server.close()
+
+    async def _refresh_loop(self, healthy: bool) -> None:
+        while True:
+            interval = self.refresh_interval if healthy else self.retry_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            healthy = await self.refresh()
+
+
+tool_registry = MCPToolRegistry(
+    get_mcp_connections(),
+    extra_tools=[rag_tool],
+    refresh_interval=settings.mcp_tools_refresh_sec,
+    retry_interval=settings.mcp_tools_retry_sec,
+)
+
+
 async def get_tools():
-    rag_tool = Tool(
-        name="knowledge_base_search",
-        func=rag_search,
-        description="Useful for searching internal knowledge base for reports and documentation and cooking recipes."
-    )
-
-    mcp_client = get_mcp_client()
-    mcp_tools = await mcp_client.get_tools()
-    mcp_tools.append(rag_tool)
-    return mcp_tools
\ No newline at end of file
+    await tool_registry.start()
+    return tool_registry.tools()
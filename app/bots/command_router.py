@@ -1,6 +1,11 @@
 ﻿from aiogram import Router, types
 from aiogram.filters import Command
 
+from app.configs.settings import settings
+from app.utils.metrics import metrics
+
+from .streaming import split_text
+
 
 router = Router(name="commands")
 
@@ -17,5 +22,22 @@ async def help_cmd(message: types.Message) -> None:
         "Commands:\n"
         "/health - check status\n"
         "/help - show this help\n"
+        "/metrics - show runtime metrics (admins only)\n"
     )
     await message.answer(text)
+
+
+@router.message(Command("metrics"))
+async def metrics_cmd(message: types.Message) -> None:
+    # внутренние метрики: имена инструментов, очереди, доли попаданий — только для админов
+    if message.chat.id not in settings.admin_chat_ids:
+        await message.answer("This command is available to administrators only")
+        return
+    lines = []
+    for name, value in metrics.snapshot().items():
+        if isinstance(value, dict):
+            value = " ".join(f"{k}={v:.4g}" for k, v in value.items())
+        lines.append(f"{name}: {value}")
+    # метрик с инструментами и коллекторами может набраться больше лимита одного сообщения
+    for part in split_text("\n".join(lines) or "no metrics yet"):
+        await message.answer(part)
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import logging
+from typing import AsyncContextManager, Awaitable, Callable
+
+from aiogram import types
+
+from app.utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[list[types.Message]], Awaitable[None]]
+ChatLock = Callable[[int], AsyncContextManager[bool]]
+
+
+class ChatDispatcher:
+    """
+    Раздает сообщения обработчику с учетом порядка и нагрузки.
+
+    - сообщения одного чата обрабатываются строго по очереди; очередь живет
+      в памяти процесса, поэтому при нескольких процессах или репликах порядок
+      между ними держит `chat_lock` — блокировка чата на время хода, общая для всех;
+    - одновременно выполняется не больше `max_concurrent` запусков агента;
+    - при `merge_window_ms` > 0 сообщения, пришедшие подряд в этот интервал,
+      склеиваются в один ход;
+    - если очередь чата или общая очередь заполнена, `submit` возвращает False,
+      и вызывающий сразу отвечает "занято", а не копит работу.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        max_concurrent: int = 8,
+        max_pending: int = 100,
+        chat_queue_size: int = 5,
+        merge_window_ms: float = 0,
+        chat_lock: ChatLock | None = None,
+    ):
+        self.handler = handler
+        self.chat_lock = chat_lock
+        self.max_pending = max_pending
+        self.chat_queue_size = chat_queue_size
+        self.merge_window = merge_window_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._queues: dict[int, asyncio.Queue] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._pending = 0
+        self._running = 0
+        self._accepting = True
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, message: types.Message) -> bool:
+        if not self._accepting or self._pending >= self.max_pending:
+            metrics.counter("dispatch.rejected").inc()
+            return False
+
+        chat_id = message.chat.id
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue(maxsize=self.chat_queue_size)
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            metrics.counter("dispatch.rejected").inc()
+            return False
+
+        self._set_pending(self._pending + 1)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._worker(chat_id, queue), name=f"chat-{chat_id}")
+        return True
+
+    def _set_pending(self, value: int) -> None:
+        self._pending = value
+        metrics.gauge("dispatch.pending").set(value)
+
+    async def _worker(self, chat_id: int, queue: asyncio.Queue) -> None:
+        try:
+            while not queue.empty():
+                batch = [queue.get_nowait()]
+                if self.merge_window:
+                    await asyncio.sleep(self.merge_window)
+                    while not queue.empty():
+                        batch.append(queue.get_nowait())
+                try:
+                    # блокировку ждем до семафора, чтобы не занимать слот агента простоем
+                    lock = self.chat_lock(chat_id) if self.chat_lock else contextlib.nullcontext(True)
+                    async with lock as locked:
+                        if not locked:
+                            metrics.counter("dispatch.lock_timeouts").inc()
+                            logger.warning("Chat %s lock wait timed out, handling without it", chat_id)
+                        async with self._semaphore:
+                            self._running += 1
+                            metrics.gauge("dispatch.running").set(self._running)
+                            try:
+                                await self.handler(batch)
+                            finally:
+                                self._running -= 1
+                                metrics.gauge("dispatch.running").set(self._running)
+                except Exception:
+                    logger.exception("Failed to handle messages of chat %s", chat_id)
+                finally:
+                    self._set_pending(self._pending - len(batch))
+        finally:
+            # между пустой очередью и этим местом нет await, так что новое сообщение
+            # не могло проскочить мимо: submit увидит, что воркера нет, и запустит новый
+            self._workers.pop(chat_id, None)
+            self._queues.pop(chat_id, None)
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """Перестает принимать сообщения и ждет, пока обработаются уже принятые."""
+        self._accepting = False
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        if pending:
+            logger.warning("Dispatcher drain timed out, cancelling %d chats", len(pending))
+            for task in pending:
+                task.cancel()
@@ -1,21 +1,110 @@
-from aiogram import Router, types
+import asyncio
+import contextvars
+import logging
+import time
+
+from aiogram import F, Router, types
 from aiogram.enums import ParseMode
 from httpx import HTTPStatusError
+from langchain_core.messages import AIMessage, HumanMessage
 
+from app.configs.settings import settings
 from app.utils.escape import escape_markdown
-from app.agent.agent import get_agent
+from app.utils.metrics import metrics
+from app.agent.agent import get_agent, get_standalone_agent
+from app.agent.answer_cache import answer_cache
+from app.memory.lock import RedisLock
+from app.memory.redis_memory import get_redis_memory
+
+from .dispatch import ChatDispatcher
+from .streaming import MessageStreamer, stream_agent
 
 router = Router(name="mcp_handler")
 
+logger = logging.getLogger(__name__)
 
+_standalone: dict[str, asyncio.Task] = {}  # вопрос: фоновый запуск агента без истории
 
-@router.message(lambda x: x == x)
-async def mcp_handler(message: types.Message) -> None:
+
+async def _cache_standalone(text: str) -> None:
+    """Ответ на тот же вопрос без истории чата — только он годится для общего кеша."""
+    try:
+        agent = await get_standalone_agent()
+        result = await agent.ainvoke({"input": text, "history": []})
+        if answer_cache.cacheable(result.get("intermediate_steps", [])):
+            await answer_cache.set(text, result["output"])
+    except Exception:
+        logger.exception("Failed to build a cacheable answer")
+
+
+def cache_standalone(text: str) -> None:
+    if text in _standalone:
+        return
+    # пустой контекст: колбэки завершенного хода сюда не нужны
+    task = asyncio.create_task(_cache_standalone(text), context=contextvars.Context())
+    _standalone[text] = task
+    task.add_done_callback(lambda _: _standalone.pop(text, None))
+
+
+async def run_agent(messages: list[types.Message]) -> None:
+    message = messages[-1]
+    text = "\n".join(m.text for m in messages)
+    session_id = str(message.chat.id)
     try:
+        memory = get_redis_memory(session_id)
+        # в кеше только ответы, полученные без истории чата, их можно отдавать любому
+        cached = await answer_cache.get(text)
+        if cached is not None:
+            await MessageStreamer(message, 0).finish(cached)
+            # ход без агента все равно должен остаться в истории
+            await memory.aadd_messages([HumanMessage(content=text), AIMessage(content=cached)])
+            return
+
+        had_history = answer_cache.enabled and await memory.ahas_history()
         agent = await get_agent()
-        config = {"configurable": {"session_id": str(message.chat.id)}}
-        result = await agent.ainvoke({"input": message.text}, config)
-        answer = escape_markdown(result["output"])
-        await message.answer(answer, parse_mode=ParseMode.MARKDOWN_V2)
+        config = {"configurable": {"session_id": session_id}}
+        if settings.stream_responses:
+            output, steps = await stream_agent(agent, text, config, message)
+        else:
+            started = time.perf_counter()
+            result = await agent.ainvoke({"input": text}, config)
+            output = result["output"]
+            steps = result.get("intermediate_steps", [])
+            await message.answer(escape_markdown(output), parse_mode=ParseMode.MARKDOWN_V2)
+            # без потока первый байт и есть весь ответ: это не TTFB
+            metrics.histogram("bot.answer_sec").observe(time.perf_counter() - started)
+
+        if answer_cache.cacheable(steps):
+            if had_history:
+                # ответ мог опереться на переписку: в общий кеш идет ответ, полученный без нее
+                cache_standalone(text)
+            else:
+                await answer_cache.set(text, output)
     except HTTPStatusError as e:
-        await message.answer("Модель перегружена\nОтправте свое сообщение позже")
\ No newline at end of file
+        await message.answer("Модель перегружена\nОтправте свое сообщение позже")
+
+
+def chat_lock(chat_id: int) -> RedisLock:
+    """Ход чата, общий для всех процессов и реплик бота."""
+    return RedisLock(
+        f"chat:lock:{chat_id}",
+        ttl=settings.chat_lock_sec,
+        wait=settings.chat_lock_wait_sec,
+        renew=True,
+    )
+
+
+dispatcher = ChatDispatcher(
+    run_agent,
+    max_concurrent=settings.agent_max_concurrency,
+    max_pending=settings.agent_max_pending,
+    chat_queue_size=settings.chat_queue_size,
+    merge_window_ms=settings.chat_merge_window_ms,
+    chat_lock=chat_lock if settings.redis_url else None,
+)
+
+
+@router.message(F.text)
+async def mcp_handler(message: types.Message) -> None:
+    if not dispatcher.submit(message):
+        await message.answer("Слишком много запросов\nОтправте свое сообщение чуть позже")
@@ -0,0 +1,41 @@
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from redis import RedisError
+
+from app.memory.pool import get_redis
+from app.utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """
+    Пропускает каждый update_id один раз на все процессы и реплики.
+
+    Telegram повторяет вебхук, если не получил ответ вовремя, а при нескольких
+    воркерах повтор может прийти в другой процесс — помечаем update в Redis через SET NX.
+    """
+
+    def __init__(self, ttl: int = 3600):
+        self.ttl = ttl
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        try:
+            fresh = await get_redis().set(f"tg:update:{event.update_id}", 1, nx=True, ex=self.ttl)
+        except RedisError as e:
+            # лучше обработать повтор, чем потерять сообщение
+            logger.warning("Update deduplication unavailable: %s", e)
+            fresh = True
+        if not fresh:
+            metrics.counter("bot.duplicate_updates").inc()
+            return None
+        return await handler(event, data)
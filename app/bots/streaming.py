@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+from aiogram import types
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.utils.chat_action import ChatActionSender
+
+from app.configs.settings import settings
+from app.utils.escape import escape_markdown
+from app.utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_LIMIT = 4096
+
+
+def split_text(text: str, limit: int = TELEGRAM_LIMIT) -> list[str]:
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+class MessageStreamer:
+    """
+    Выводит ответ в одно сообщение Telegram по мере генерации.
+
+    Правки сообщения идут не чаще раза в `interval` секунд, чтобы не упереться
+    в лимиты Telegram; промежуточный текст отправляется без разметки,
+    финальный — в MarkdownV2.
+    """
+
+    def __init__(self, reply_to: types.Message, interval: float):
+        self.reply_to = reply_to
+        self.interval = interval
+        self.message: types.Message | None = None
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def show(self, text: str, force: bool = False) -> None:
+        text = text[:TELEGRAM_LIMIT]
+        if not text.strip() or text == self._shown:
+            return
+        if not force and time.monotonic() - self._last_edit < self.interval:
+            return
+        await self._send(text)
+
+    async def finish(self, text: str) -> None:
+        parts = split_text(escape_markdown(text))
+        await self._send(parts[0], parse_mode=ParseMode.MARKDOWN_V2)
+        for part in parts[1:]:
+            await self._call(self.reply_to.answer, part, parse_mode=ParseMode.MARKDOWN_V2)
+
+    async def _send(self, text: str, parse_mode: str | None = None) -> None:
+        if self.message is None:
+            self.message = await self._call(self.reply_to.answer, text, parse_mode=parse_mode)
+        else:
+            await self._call(self.message.edit_text, text, parse_mode=parse_mode)
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+    @staticmethod
+    async def _call(method, text: str, parse_mode: str | None = None):
+        for _ in range(3):
+            try:
+                return await method(text, parse_mode=parse_mode)
+            except TelegramRetryAfter as e:
+                metrics.counter("bot.telegram_retry_after").inc()
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                if "message is not modified" in e.message:
+                    return None
+                if parse_mode is None:
+                    raise
+                # модель выдала разметку, которую Telegram не принял — шлем как есть
+                parse_mode = None
+        return None
+
+
+async def stream_agent(agent, text: str, config: dict, message: types.Message) -> tuple[str, list]:
+    """
+    Запускает агента через поток событий и выводит прогресс и ответ в чат.
+
+    Возвращает ответ и шаги агента за ход: пары (действие, результат инструмента).
+    """
+    streamer = MessageStreamer(message, settings.stream_edit_interval_sec)
+    started = time.perf_counter()
+    first_token = None
+    answer = ""
+    output = None
+
+    async with ChatActionSender.typing(bot=message.bot, chat_id=message.chat.id):
+        async for event in agent.astream_events({"input": text}, config, version="v2"):
+            kind = event["event"]
+            if kind == "on_tool_start":
+                # текст до вызова инструмента — не финальный ответ
+                answer = ""
+                await streamer.show(f"⏳ {event['name']}…", force=True)
+            elif kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if not isinstance(content, str) or not content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    metrics.histogram("bot.ttfb_sec").observe(first_token)
+                    logger.info("Time to first token in chat %s: %.2fs", message.chat.id, first_token)
+                answer += content
+                await streamer.show(answer)
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = event["data"].get("output")
+
+    steps = []
+    if isinstance(output, dict):
+        answer = output.get("output") or answer
+        steps = output.get("intermediate_steps", [])
+    await streamer.finish(answer or "…")
+    metrics.histogram("bot.answer_sec").observe(time.perf_counter() - started)
+    return answer, steps
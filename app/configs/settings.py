@@ -16,17 +16,84 @@ class MCPSettings:
 @dataclass
 class Settings:
     bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN")
+    bot_mode: str = os.getenv("BOT_MODE", "polling")  # polling | webhook
+    webhook_url: str | None = os.getenv("WEBHOOK_URL")
+    webhook_path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    webhook_secret: str | None = os.getenv("WEBHOOK_SECRET")
+    webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    webhook_port: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    webhook_workers: int = int(os.getenv("WEBHOOK_WORKERS", "1"))
+    update_dedup_ttl_sec: int = int(os.getenv("UPDATE_DEDUP_TTL_SEC", "3600"))
+    admin_chat_ids: frozenset[int] = frozenset(
+        int(chat_id) for chat_id in os.getenv("ADMIN_CHAT_IDS", "").split(",") if chat_id.strip()
+    )  # кому доступны служебные команды вроде /metrics
     mistral_api_key: str = os.getenv("MISTRAL_API_KEY")
 
     mcp_calendar = MCPSettings("calendar")
     mcp_mail = MCPSettings("mail")
     mcp_sheet = MCPSettings("sheet")
+    mcp_tools_refresh_sec: int = int(os.getenv("MCP_TOOLS_REFRESH_SEC", "300"))
+    mcp_tools_retry_sec: int = int(os.getenv("MCP_TOOLS_RETRY_SEC", "15"))
+
+    agent_max_concurrency: int = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+    agent_max_parallel_tools: int = int(os.getenv("AGENT_MAX_PARALLEL_TOOLS", "4"))
+    agent_max_pending: int = int(os.getenv("AGENT_MAX_PENDING", "100"))
+    chat_queue_size: int = int(os.getenv("CHAT_QUEUE_SIZE", "5"))
+    chat_merge_window_ms: float = float(os.getenv("CHAT_MERGE_WINDOW_MS", "0"))
+    chat_lock_sec: float = float(os.getenv("CHAT_LOCK_SEC", "30"))
+    chat_lock_wait_sec: float = float(os.getenv("CHAT_LOCK_WAIT_SEC", "300"))
+    stream_responses: bool = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    stream_edit_interval_sec: float = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", "1.2"))
+    shutdown_drain_sec: float = float(os.getenv("SHUTDOWN_DRAIN_SEC", "30"))
 
     redis_url: str = os.getenv("REDIS_URL")
+    redis_pool_size: int = int(os.getenv("REDIS_POOL_SIZE", "32"))
+    redis_pool_timeout_sec: float = float(os.getenv("REDIS_POOL_TIMEOUT_SEC", "5"))
+    redis_socket_timeout_sec: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_SEC", "5"))
+
+    memory_window_turns: int = int(os.getenv("MEMORY_WINDOW_TURNS", "10"))
+    memory_max_tokens: int = int(os.getenv("MEMORY_MAX_TOKENS", "3000"))
+    memory_summarize_batch_turns: int = int(os.getenv("MEMORY_SUMMARIZE_BATCH_TURNS", "5"))
+    memory_summary_model: str = os.getenv("MEMORY_SUMMARY_MODEL", "mistral-small-latest")
+    memory_summary_lock_sec: int = int(os.getenv("MEMORY_SUMMARY_LOCK_SEC", "120"))
+    memory_ttl_sec: int = int(os.getenv("MEMORY_TTL_SEC", str(30 * 24 * 3600)))
+    memory_max_messages: int = int(os.getenv("MEMORY_MAX_MESSAGES", "200"))
+
     qdrant_url: str = os.getenv("QDRANT_URL")
 
     embeddings_model: str = os.getenv("EMBEDDINGS_MODEL", "intfloat/multilingual-e5-base")
+    embeddings_workers: int = int(os.getenv("EMBEDDINGS_WORKERS", "2"))
+    embeddings_batch_window_ms: float = float(os.getenv("EMBEDDINGS_BATCH_WINDOW_MS", "5"))
+    embeddings_batch_size: int = int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32"))
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", "2"))
     llm_model: str = os.getenv("LLM_MODEL", "mistral-large-latest")
+    chars_per_token: float = float(os.getenv("CHARS_PER_TOKEN", "3"))
     collection_name: str = os.getenv("COLLECTION_NAME", "rag")
 
+    qdrant_vector_size: int = int(os.getenv("QDRANT_VECTOR_SIZE", "768"))
+    qdrant_quantization: str = os.getenv("QDRANT_QUANTIZATION", "none")  # none | scalar | binary
+    qdrant_oversampling: float = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+    qdrant_hnsw_m: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    qdrant_hnsw_ef_construct: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    qdrant_search_ef: int = int(os.getenv("QDRANT_SEARCH_EF", "128"))
+    qdrant_on_disk: bool = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"
+
+    rag_candidates: int = int(os.getenv("RAG_CANDIDATES", "40"))
+    rag_context_tokens: int = int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))
+    rag_rerank: str = os.getenv("RAG_RERANK", "mmr")  # mmr | cross-encoder | none
+    rag_mmr_lambda: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    rag_reranker_model: str = os.getenv("RAG_RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+
+    rag_embedding_cache_size: int = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "2048"))
+    rag_embedding_cache_redis: bool = os.getenv("RAG_EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+    rag_retrieval_cache_size: int = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "1024"))
+    rag_retrieval_cache_ttl_sec: int = int(os.getenv("RAG_RETRIEVAL_CACHE_TTL_SEC", "600"))
+    rag_cache_generation_check_sec: float = float(os.getenv("RAG_CACHE_GENERATION_CHECK_SEC", "5"))
+
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    answer_cache_ttl_sec: int = int(os.getenv("ANSWER_CACHE_TTL_SEC", str(24 * 3600)))
+    answer_cache_similarity: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
 settings = Settings()
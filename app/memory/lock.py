@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import uuid
+
+from .pool import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+# снимает и продлевает блокировку, только если она все еще наша
+_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_EXTEND = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Блокировка на ключе Redis, общая для всех процессов и реплик.
+
+    Берется через SET NX со случайным токеном и живет `ttl` секунд, чтобы
+    упавший владелец не держал ее вечно. Снимается и продлевается только
+    владельцем: если блокировка успела истечь и ее взял другой, чужой ключ
+    не трогаем. При `renew` блокировка продлевается, пока держится.
+
+        async with RedisLock("chat:lock:42", ttl=60, wait=600):
+            ...
+    """
+
+    def __init__(self, key: str, ttl: float, wait: float | None = None, poll: float = 0.1, renew: bool = False):
+        self.key = key
+        self.ttl = ttl
+        self.wait = wait
+        self.poll = poll
+        self.renew = renew
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        self._renewer: asyncio.Task | None = None
+
+    async def acquire(self) -> bool:
+        """Ждет блокировку не дольше `wait` секунд (None — без ожидания)."""
+        client = get_redis()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.wait or 0)
+        while True:
+            if await client.set(self.key, self.token, nx=True, px=int(self.ttl * 1000)):
+                self.acquired = True
+                if self.renew:
+                    self._renewer = asyncio.create_task(self._renew_loop())
+                return True
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(self.poll)
+
+    async def release(self) -> None:
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        if self.acquired:
+            self.acquired = False
+            await get_redis().eval(_RELEASE, 1, self.key, self.token)
+
+    async def _renew_loop(self) -> None:
+        client = get_redis()
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await client.eval(_EXTEND, 1, self.key, self.token, int(self.ttl * 1000)):
+                    logger.warning("Lock %s was lost", self.key)
+                    return
+            except Exception:
+                logger.exception("Failed to extend lock %s", self.key)
+
+    async def __aenter__(self) -> bool:
+        return await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
@@ -0,0 +1,46 @@
+import redis.asyncio as aioredis
+
+from app.configs.settings import settings
+from app.utils.metrics import metrics
+
+
+_pool: aioredis.BlockingConnectionPool | None = None
+
+
+def get_pool() -> aioredis.BlockingConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = aioredis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_pool_size,
+            timeout=settings.redis_pool_timeout_sec,
+            socket_timeout=settings.redis_socket_timeout_sec,
+            socket_connect_timeout=settings.redis_socket_timeout_sec,
+            health_check_interval=30,
+        )
+    return _pool
+
+
+def get_redis() -> aioredis.Redis:
+    """Клиент поверх общего на процесс пула соединений."""
+    return aioredis.Redis(connection_pool=get_pool())
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {"in_use": 0, "idle": 0, "max": settings.redis_pool_size}
+    return {
+        "in_use": len(_pool._in_use_connections),
+        "idle": len(_pool._available_connections),
+        "max": _pool.max_connections,
+    }
+
+
+async def close_redis() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+
+
+metrics.register_collector("redis.pool", pool_stats)
@@ -1,8 +1,233 @@
-from langchain_community.chat_message_histories import RedisChatMessageHistory
+import asyncio
+import contextvars
+import json
+import logging
+from typing import Sequence
+
+import redis
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
 from app.configs.settings import settings
+from app.utils.metrics import metrics
+from app.utils.tokens import estimate_tokens
+
+from .lock import RedisLock
+from .pool import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+_TYPES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+_CODES = {"human": "h", "ai": "a", "system": "s"}
+
+_client: redis.Redis | None = None
+_summarizer = None
+_summarizing: set[asyncio.Task] = set()
+
+
+def get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_url)
+    return _client
+
+
+def get_summarizer():
+    global _summarizer
+    if _summarizer is None:
+        from langchain_mistralai import ChatMistralAI
+        from app.agent.prompt import summary_prompt
+
+        llm = ChatMistralAI(
+            model=settings.memory_summary_model,
+            mistral_api_key=settings.mistral_api_key,
+        )
+        _summarizer = summary_prompt | llm
+    return _summarizer
+
+
+def dump_message(message: BaseMessage) -> str:
+    return json.dumps({"t": _CODES.get(message.type, "h"), "c": message.content}, ensure_ascii=False)
+
+
+def load_message(raw: bytes | str) -> BaseMessage:
+    data = json.loads(raw)
+    return _TYPES[data["t"]](content=data["c"])
+
+
+class BoundedRedisChatMessageHistory(BaseChatMessageHistory):
+    """
+    История чата в Redis ограниченного размера.
+
+    Последние `window` сообщений хранятся дословно, более старые сворачиваются
+    в краткое резюме фоновой задачей, вне пути запроса. Сообщения лежат в списке
+    компактным json, резюме — в отдельном ключе; чтение и запись одного хода —
+    по одному пайплайну. Оба ключа живут `ttl` секунд с последнего хода.
+    Если резюме раз за разом не получается, список все равно не растет больше
+    `max_messages`: самые старые сообщения отбрасываются.
+
+    Асинхронные методы работают через общий пул `app.memory.pool`,
+    синхронные — через отдельный клиент для скриптов.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        window: int | None = None,
+        max_tokens: int | None = None,
+        ttl: int | None = None,
+        max_messages: int | None = None,
+    ):
+        self.session_id = session_id
+        self.window = window or settings.memory_window_turns * 2
+        self.max_tokens = max_tokens or settings.memory_max_tokens
+        self.ttl = ttl or settings.memory_ttl_sec
+        self.max_messages = max(
+            max_messages or settings.memory_max_messages,
+            self.window + settings.memory_summarize_batch_turns * 2 + 2,
+        )
+
+    @property
+    def client(self) -> redis.Redis:
+        return get_client()
+
+    @property
+    def messages_key(self) -> str:
+        return f"chat:{self.session_id}:messages"
+
+    @property
+    def summary_key(self) -> str:
+        return f"chat:{self.session_id}:summary"
+
+    @property
+    def lock_key(self) -> str:
+        return f"chat:{self.session_id}:summary_lock"
+
+    # ---------- Чтение ----------
+
+    def _window_start(self, messages: list[BaseMessage], window: int | None = None) -> int:
+        """Индекс первого сообщения, которое помещается в окно и бюджет токенов."""
+        window = self.window if window is None else window
+        used = 0
+        start = len(messages)
+        while start > max(0, len(messages) - window):
+            used += estimate_tokens(str(messages[start - 1].content))
+            if used > self.max_tokens:
+                break
+            start -= 1
+        return start
+
+    def _build(self, summary: bytes | None, raw_messages: list) -> tuple[list[BaseMessage], bool]:
+        """Сообщения для модели и признак, что бюджет токенов отрезал часть несвернутых."""
+        messages = [load_message(raw) for raw in raw_messages]
+        # в списке только еще не свернутые в резюме сообщения: окно ограничивает то,
+        # что сворачивать, а читать нужно все, иначе вышедшие из окна до следующего
+        # резюме ходы модель не увидит вовсе
+        start = self._window_start(messages, window=len(messages))
+        messages = messages[start:]
+        if summary:
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary.decode()}"))
+        return messages, start > 0
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.summary_key)
+        pipe.lrange(self.messages_key, 0, -1)
+        summary, raw_messages = pipe.execute()
+        return self._build(summary, raw_messages)[0]
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        with metrics.timer("memory.read_sec"):
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.get(self.summary_key)
+                pipe.lrange(self.messages_key, 0, -1)
+                summary, raw_messages = await pipe.execute()
+        messages, truncated = self._build(summary, raw_messages)
+        if truncated:
+            # не влезло в бюджет то, что еще не в резюме, — сворачиваем, не дожидаясь длины списка
+            self._schedule_summary()
+        return messages
+
+    async def ahas_history(self) -> bool:
+        """Есть ли у чата прошлые сообщения или резюме."""
+        return bool(await get_redis().exists(self.messages_key, self.summary_key))
+
+    # ---------- Запись ----------
+
+    def _queue_append(self, pipe, messages: Sequence[BaseMessage]) -> None:
+        pipe.rpush(self.messages_key, *(dump_message(m) for m in messages))
+        # предохранитель на случай, когда резюме не складывается: в норме список
+        # сворачивается задолго до предела и начало его трогает только asummarize
+        pipe.ltrim(self.messages_key, -self.max_messages, -1)
+        pipe.expire(self.messages_key, self.ttl)
+        pipe.expire(self.summary_key, self.ttl)
+
+    def _needs_summary(self, length: int) -> bool:
+        return length > self.window + settings.memory_summarize_batch_turns * 2
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        self._queue_append(pipe, messages)
+        pipe.execute()
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with metrics.timer("memory.write_sec"):
+            async with get_redis().pipeline(transaction=False) as pipe:
+                self._queue_append(pipe, messages)
+                length, *_ = await pipe.execute()
+        if self._needs_summary(length):
+            self._schedule_summary()
+
+    def _schedule_summary(self) -> None:
+        # пустой контекст: иначе резюме унаследует колбэки текущего запуска агента
+        # и его токены попадут в поток ответа пользователю
+        task = asyncio.create_task(self.asummarize(), context=contextvars.Context())
+        _summarizing.add(task)
+        task.add_done_callback(_summarizing.discard)
+
+    def clear(self) -> None:
+        self.client.delete(self.messages_key, self.summary_key)
+
+    async def aclear(self) -> None:
+        await get_redis().delete(self.messages_key, self.summary_key)
+
+    # ---------- Резюме ----------
+
+    async def asummarize(self) -> None:
+        """Сворачивает в резюме все сообщения, не попадающие в окно или бюджет токенов."""
+        client = get_redis()
+        # блокировка продлевается, пока идет резюме, и снимается, только если еще наша
+        lock = RedisLock(self.lock_key, ttl=settings.memory_summary_lock_sec, renew=True)
+        if not await lock.acquire():
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(self.summary_key)
+                pipe.lrange(self.messages_key, 0, -1)
+                summary, raw_messages = await pipe.execute()
+            messages = [load_message(raw) for raw in raw_messages]
+            folded = self._window_start(messages)
+            if not folded:
+                return
+
+            lines = "\n".join(f"{m.type}: {m.content}" for m in messages[:folded])
+            result = await get_summarizer().ainvoke({
+                "summary": summary.decode() if summary else "(empty)",
+                "messages": lines,
+            })
+
+            # в начало списка никто кроме нас не пишет, поэтому срезаем ровно то, что свернули
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.set(self.summary_key, result.content, ex=self.ttl)
+                pipe.ltrim(self.messages_key, folded, -1)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to summarize history of %s", self.session_id)
+        finally:
+            await lock.release()
+
 
 def get_redis_memory(session_id: str):
-    return RedisChatMessageHistory(
-        url=settings.redis_url,
-        session_id=session_id,
-    )
\ No newline at end of file
+    return BoundedRedisChatMessageHistory(session_id)
@@ -0,0 +1,106 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Хранит последние `window` значений и считает по ним перцентили."""
+
+    def __init__(self, window: int = 2048):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = Lock()
+
+    def _get(self, name: str, kind):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, kind())
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(name, Gauge)
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(name, Histogram)
+
+    def register_collector(self, name: str, collect) -> None:
+        """`collect()` вызывается при каждом snapshot и возвращает значение метрики `name`."""
+        self._collectors[name] = collect
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные значения; коллекторы остаются."""
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self) -> dict:
+        result = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        for name, collect in self._collectors.items():
+            result[name] = collect()
+        return dict(sorted(result.items()))
+
+    @contextmanager
+    def timer(self, name: str):
+        """Замеряет время блока в секундах и пишет его в гистограмму `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - start)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,6 @@
+from app.configs.settings import settings
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора модели."""
+    return max(1, int(len(text) / settings.chars_per_token))
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable
+
+from app.utils.metrics import metrics
+
+
+class EmbeddingBatcher:
+    """
+    Микро-батчинг эмбеддингов для одновременных запросов.
+
+    Запросы копятся до `window_ms` миллисекунд или до `max_batch` штук,
+    затем кодируются одним вызовом модели, и каждый вызывающий получает свой вектор.
+    Одновременно выполняется не больше `max_inflight` батчей — пока модель занята,
+    очередь набирает следующий батч. После `aclose` все ждущие вектора вызовы
+    получают ошибку, а не висят.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        executor: Executor,
+        window_ms: float = 5,
+        max_batch: int = 32,
+        max_inflight: int = 1,
+    ):
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self._queue: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        if self._task is None or self._task.done():
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        metrics.gauge("rag.embed_queue_depth").set(self._queue.qsize())
+        return await future
+
+    def _start(self) -> None:
+        previous = self._queue
+        self._queue = asyncio.Queue()
+        # если прошлый цикл упал, его запросы переходят в новую очередь
+        while previous is not None and not previous.empty():
+            self._queue.put_nowait(previous.get_nowait())
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._task = asyncio.create_task(self._run(), name="embedding-batcher")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._slots.acquire()
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.window
+                while len(batch) < self.max_batch:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail(batch)
+                raise
+            metrics.gauge("rag.embed_queue_depth").set(self._queue.qsize())
+
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._encode(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _encode(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        metrics.histogram("rag.embed_batch_size").observe(len(batch))
+        try:
+            with metrics.timer("rag.embed_batch_sec"):
+                vectors = await loop.run_in_executor(
+                    self.executor, self.embed_batch, [text for text, _ in batch]
+                )
+        except asyncio.CancelledError:
+            self._fail(batch)
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    @staticmethod
+    def _fail(batch: list[tuple[str, asyncio.Future]], error: Exception | None = None) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error or RuntimeError("Embedding batcher is closed"))
+
+    async def aclose(self) -> None:
+        tasks = list(self._inflight)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._queue is not None:
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._fail(pending)
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import re
+import time
+from array import array
+from collections import OrderedDict
+
+import redis
+from qdrant_client.models import ScoredPoint
+
+from app.configs.settings import settings
+from app.memory.pool import get_redis
+from app.utils.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+_spaces = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Приводит вопрос к каноничному виду: регистр, пробелы, пунктуация по краям."""
+    return _spaces.sub(" ", text.lower()).strip(" \t\n.,!?;:")
+
+
+def vector_hash(vector: list[float]) -> str:
+    return hashlib.sha1(array("f", vector).tobytes()).hexdigest()
+
+
+def record_hit(name: str, hit: bool) -> None:
+    hits = metrics.counter(f"{name}.hits")
+    misses = metrics.counter(f"{name}.misses")
+    (hits if hit else misses).inc()
+    metrics.gauge(f"{name}.hit_rate").set(round(hits.value / (hits.value + misses.value), 4))
+
+
+class LRUCache:
+    """Простой LRU с необязательным TTL на запись."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class EmbeddingCache:
+    """
+    Первый уровень: нормализованный текст запроса -> вектор.
+
+    In-process LRU, при `use_redis` дополнительно хранится в Redis,
+    чтобы вектор переживал перезапуск и был общим для реплик.
+    """
+
+    def __init__(self, model: str, maxsize: int, use_redis: bool = False, redis_ttl: int = 86400):
+        self.model = model
+        self.local = LRUCache(maxsize)
+        self.use_redis = use_redis and bool(settings.redis_url)
+        self.redis_ttl = redis_ttl
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha1(f"{self.model}\0{text}".encode()).hexdigest()
+        return f"rag:emb:{digest}"
+
+    async def get(self, text: str) -> list[float] | None:
+        vector = self.local.get(text)
+        if vector is None and self.use_redis:
+            try:
+                raw = await get_redis().get(self._key(text))
+            except redis.RedisError as e:
+                logger.warning("Embedding cache lookup failed: %s", e)
+                raw = None
+            if raw is not None:
+                vector = array("f", raw).tolist()
+                self.local.set(text, vector)
+        record_hit("rag.embedding_cache", vector is not None)
+        return vector
+
+    async def set(self, text: str, vector: list[float]) -> None:
+        self.local.set(text, vector)
+        if self.use_redis:
+            try:
+                await get_redis().set(self._key(text), array("f", vector).tobytes(), ex=self.redis_ttl)
+            except redis.RedisError as e:
+                logger.warning("Embedding cache store failed: %s", e)
+
+
+class CollectionGenerations:
+    """
+    Номер поколения коллекции: растет при каждой записи в нее.
+
+    Ключи кеша выдачи включают поколение, поэтому запись в коллекцию
+    инвалидирует кеш без явной очистки. Номер хранится в Redis, чтобы загрузка
+    из `scripts/load_pdf.py` (отдельный процесс) была видна боту.
+    """
+
+    def __init__(self, check_interval: float = 5):
+        self.check_interval = check_interval
+        self._local: dict[str, tuple[float, int]] = {}
+
+    @staticmethod
+    def _key(collection: str) -> str:
+        return f"rag:gen:{collection}"
+
+    async def current(self, collection: str) -> int:
+        checked_at, generation = self._local.get(collection, (0.0, 0))
+        if not settings.redis_url or time.monotonic() - checked_at < self.check_interval:
+            return generation
+        try:
+            raw = await get_redis().get(self._key(collection))
+            generation = int(raw or 0)
+        except redis.RedisError as e:
+            logger.warning("Collection generation lookup failed: %s", e)
+        self._local[collection] = (time.monotonic(), generation)
+        return generation
+
+    def bump(self, collection: str) -> int:
+        _, generation = self._local.get(collection, (0.0, 0))
+        generation += 1
+        if settings.redis_url:
+            try:
+                with redis.Redis.from_url(settings.redis_url) as client:
+                    generation = client.incr(self._key(collection))
+            except redis.RedisError as e:
+                logger.warning("Collection generation bump failed: %s", e)
+        self._local[collection] = (time.monotonic(), generation)
+        return generation
+
+
+class RetrievalCache:
+    """Второй уровень: (коллекция, поколение, хеш вектора, k) -> найденные точки, с TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.local = LRUCache(maxsize, ttl)
+
+    def get(
+        self, collection: str, generation: int, vector: list[float], k: int, with_vectors: bool = False
+    ) -> list[ScoredPoint] | None:
+        points = self.local.get((collection, generation, vector_hash(vector), k, with_vectors))
+        record_hit("rag.retrieval_cache", points is not None)
+        return list(points) if points is not None else None
+
+    def set(
+        self,
+        collection: str,
+        generation: int,
+        vector: list[float],
+        k: int,
+        with_vectors: bool,
+        points: list[ScoredPoint],
+    ) -> None:
+        self.local.set((collection, generation, vector_hash(vector), k, with_vectors), list(points))
+
+
+generations = CollectionGenerations(settings.rag_cache_generation_check_sec)
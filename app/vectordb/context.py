@@ -0,0 +1,204 @@
+import asyncio
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.configs.settings import settings
+from app.utils.metrics import metrics
+from app.utils.tokens import estimate_tokens
+
+from .store import VectorStoreService
+
+
+_spaces = re.compile(r"\s+")
+
+
+@dataclass
+class Candidate:
+    text: str
+    score: float
+    source: str | None = None
+    page: int | None = None
+    chunks: list[int] = field(default_factory=list)
+    vector: np.ndarray | None = None
+
+    @property
+    def key(self) -> tuple:
+        return self.source, self.page
+
+
+def _normalize(vector) -> np.ndarray | None:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def join_overlapping(left: str, right: str, max_overlap: int = 64) -> str:
+    """Склеивает соседние чанки, убирая повтор, оставленный chunk_overlap сплиттера."""
+    for size in range(min(max_overlap, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def dedupe(candidates: list[Candidate], threshold: float = 0.97) -> list[Candidate]:
+    """Убирает повторы: одинаковый текст, вложенный текст и почти совпадающие векторы."""
+    kept: list[Candidate] = []
+    for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+        text = _spaces.sub(" ", candidate.text).strip()
+        duplicate = False
+        for other in kept:
+            other_text = _spaces.sub(" ", other.text).strip()
+            if text in other_text:
+                duplicate = True
+            elif candidate.vector is not None and other.vector is not None:
+                duplicate = float(candidate.vector @ other.vector) >= threshold
+            if duplicate:
+                break
+        if not duplicate:
+            kept.append(candidate)
+    return kept
+
+
+def merge_adjacent(candidates: list[Candidate]) -> list[Candidate]:
+    """Сливает соседние чанки одной страницы одного источника в один фрагмент."""
+    groups: dict[tuple, list[Candidate]] = {}
+    loose: list[Candidate] = []
+    for candidate in candidates:
+        if candidate.source is None or not candidate.chunks:
+            loose.append(candidate)
+        else:
+            groups.setdefault(candidate.key, []).append(candidate)
+
+    merged = list(loose)
+    for group in groups.values():
+        group.sort(key=lambda c: c.chunks[0])
+        current = group[0]
+        for candidate in group[1:]:
+            if candidate.chunks[0] == current.chunks[-1] + 1:
+                vectors = [v for v in (current.vector, candidate.vector) if v is not None]
+                current = Candidate(
+                    text=join_overlapping(current.text, candidate.text),
+                    score=max(current.score, candidate.score),
+                    source=current.source,
+                    page=current.page,
+                    chunks=current.chunks + candidate.chunks,
+                    vector=_normalize(np.mean(vectors, axis=0)) if vectors else None,
+                )
+            else:
+                merged.append(current)
+                current = candidate
+        merged.append(current)
+    return merged
+
+
+def mmr(query_vector, candidates: list[Candidate], lambda_mult: float) -> list[Candidate]:
+    """Maximal Marginal Relevance: релевантность минус похожесть на уже выбранное."""
+    if not candidates or any(c.vector is None for c in candidates):
+        return sorted(candidates, key=lambda c: c.score, reverse=True)
+    query = _normalize(query_vector)
+    vectors = np.stack([c.vector for c in candidates])
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected: list[int] = []
+    remaining = list(range(len(candidates)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i] for i in selected]
+
+
+@lru_cache(maxsize=1)
+def _cross_encoder(model_name: str):
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name)
+
+
+def cross_encoder_rerank(query: str, candidates: list[Candidate], model_name: str) -> list[Candidate]:
+    if not candidates:
+        return candidates
+    scores = _cross_encoder(model_name).predict([(query, c.text) for c in candidates])
+    order = np.argsort(-np.asarray(scores))
+    return [candidates[i] for i in order]
+
+
+def pack(candidates: list[Candidate], budget: int) -> list[Candidate]:
+    """Берет фрагменты в порядке ранжирования, пока они помещаются в бюджет токенов."""
+    packed = []
+    used = 0
+    for candidate in candidates:
+        tokens = estimate_tokens(candidate.text)
+        if used + tokens > budget:
+            continue
+        packed.append(candidate)
+        used += tokens
+    return packed
+
+
+def to_candidate(document: Document, score: float, vector=None) -> Candidate:
+    metadata = document.metadata
+    chunk = metadata.get("chunk")
+    return Candidate(
+        text=document.page_content,
+        score=score,
+        source=metadata.get("source"),
+        page=metadata.get("page"),
+        chunks=[chunk] if chunk is not None else [],
+        vector=_normalize(vector),
+    )
+
+
+async def assemble_context(
+    service: VectorStoreService,
+    query: str,
+    collection_name: str,
+    candidates: int | None = None,
+    budget: int | None = None,
+    rerank: str | None = None,
+) -> str:
+    """
+    Собирает контекст для LLM из выдачи Qdrant.
+
+    Берет `candidates` кандидатов, убирает дубли, сливает соседние чанки,
+    переранжирует (`mmr`, `cross-encoder` или `none`) и укладывает в `budget` токенов.
+    """
+    candidates = candidates or settings.rag_candidates
+    budget = budget or settings.rag_context_tokens
+    rerank = rerank or settings.rag_rerank
+
+    query_vector, points = await service.asearch_points(
+        query, candidates, collection_name, with_vectors=rerank == "mmr"
+    )
+    items = [
+        to_candidate(service.to_document(point), point.score, point.vector)
+        for point in points
+    ]
+    items = merge_adjacent(dedupe(items))
+
+    if rerank == "mmr":
+        items = mmr(query_vector, items, settings.rag_mmr_lambda)
+    elif rerank == "cross-encoder":
+        with metrics.timer("rag.rerank_sec"):
+            items = await asyncio.get_running_loop().run_in_executor(
+                service.executor, cross_encoder_rerank, query, items, settings.rag_reranker_model
+            )
+    else:
+        items = sorted(items, key=lambda c: c.score, reverse=True)
+
+    items = pack(items, budget)
+    context = "\n\n".join(c.text for c in items)
+    metrics.histogram("rag.context_tokens").observe(estimate_tokens(context) if context else 0)
+    return context
@@ -0,0 +1,128 @@
+import hashlib
+import uuid
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator
+
+from qdrant_client import models
+from langchain_core.documents import Document
+from langchain_qdrant import QdrantVectorStore
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .cache import generations
+
+
+SOURCE_KEY = f"{QdrantVectorStore.METADATA_KEY}.source"
+
+
+@dataclass
+class IngestStats:
+    added: int = 0
+    skipped: int = 0
+    deleted: int = 0
+
+
+def get_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=200,
+        chunk_overlap=20,
+        separators=["\n\n", "\n", "."]
+    )
+
+
+def chunk_id(source: str, page: int, chunk: int, text: str) -> str:
+    """Детерминированный id чанка: одинаковый контент на том же месте дает тот же id."""
+    digest = hashlib.sha256(f"{source}\0{page}\0{chunk}\0{text}".encode()).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+
+def iter_chunks(pages: Iterable[Document | str], source: str) -> Iterator[tuple[str, str, dict]]:
+    """Режет страницы на чанки по мере чтения, не держа документ целиком в памяти."""
+    splitter = get_splitter()
+    for i, page in enumerate(pages):
+        if isinstance(page, Document):
+            content, page_number = page.page_content, page.metadata.get("page", i)
+        else:
+            content, page_number = page, i
+        for j, text in enumerate(splitter.split_text(content)):
+            metadata = {"source": source, "page": page_number, "chunk": j}
+            yield chunk_id(source, page_number, j, text), text, metadata
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def ingest(
+    store: QdrantVectorStore,
+    pages: Iterable[Document | str],
+    source: str,
+    batch_size: int = 64,
+    prune: bool = True,
+) -> IngestStats:
+    """
+    Загружает документ в коллекцию пачками по `batch_size` чанков.
+
+    Чанки, которые уже есть в коллекции, не эмбеддятся повторно.
+    При `prune` чанки этого `source`, пропавшие из новой версии документа, удаляются.
+    """
+    client = store.client
+    collection = store.collection_name
+    stats = IngestStats()
+    seen: set[str] = set()
+
+    for batch in _batched(iter_chunks(pages, source), batch_size):
+        batch = [item for item in batch if item[0] not in seen]
+        seen.update(item[0] for item in batch)
+        existing = {
+            str(point.id)
+            for point in client.retrieve(
+                collection_name=collection,
+                ids=[item[0] for item in batch],
+                with_payload=False,
+                with_vectors=False,
+            )
+        }
+        new = [item for item in batch if item[0] not in existing]
+        stats.skipped += len(batch) - len(new)
+        if new:
+            ids, texts, metadatas = zip(*new)
+            store.add_texts(texts=list(texts), metadatas=list(metadatas), ids=list(ids), batch_size=batch_size)
+            stats.added += len(new)
+
+    if prune:
+        stats.deleted = _delete_stale(store, source, seen, batch_size)
+
+    if stats.added or stats.deleted:
+        generations.bump(collection)
+    return stats
+
+
+def _delete_stale(store: QdrantVectorStore, source: str, keep: set[str], batch_size: int) -> int:
+    client = store.client
+    source_filter = models.Filter(
+        must=[models.FieldCondition(key=SOURCE_KEY, match=models.MatchValue(value=source))]
+    )
+    stale = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=store.collection_name,
+            scroll_filter=source_filter,
+            limit=256,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        stale.extend(str(point.id) for point in points if str(point.id) not in keep)
+        if offset is None:
+            break
+
+    for batch in _batched(stale, batch_size):
+        client.delete(
+            collection_name=store.collection_name,
+            points_selector=models.PointIdsList(points=batch),
+        )
+    return len(stale)
@@ -0,0 +1,82 @@
+from qdrant_client import QdrantClient, models
+from langchain_qdrant import QdrantVectorStore
+
+from app.configs.settings import settings
+
+
+PAYLOAD_INDEXES = {
+    f"{QdrantVectorStore.METADATA_KEY}.source": models.PayloadSchemaType.KEYWORD,
+    f"{QdrantVectorStore.METADATA_KEY}.page": models.PayloadSchemaType.INTEGER,
+    f"{QdrantVectorStore.METADATA_KEY}.chunk": models.PayloadSchemaType.INTEGER,
+}
+
+
+def vectors_config() -> models.VectorParams:
+    return models.VectorParams(
+        size=settings.qdrant_vector_size,
+        distance=models.Distance.COSINE,
+        on_disk=settings.qdrant_on_disk,
+    )
+
+
+def hnsw_config() -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(
+        m=settings.qdrant_hnsw_m,
+        ef_construct=settings.qdrant_hnsw_ef_construct,
+        on_disk=settings.qdrant_on_disk,
+    )
+
+
+def quantization_config() -> models.QuantizationConfig | None:
+    if settings.qdrant_quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+    if settings.qdrant_quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+
+def search_params() -> models.SearchParams:
+    quantization = None
+    if settings.qdrant_quantization in ("scalar", "binary"):
+        quantization = models.QuantizationSearchParams(
+            rescore=True,
+            oversampling=settings.qdrant_oversampling,
+        )
+    return models.SearchParams(hnsw_ef=settings.qdrant_search_ef, quantization=quantization)
+
+
+def create_collection(client: QdrantClient, collection_name: str) -> None:
+    """Создает коллекцию по схеме из настроек вместе с индексами полезной нагрузки."""
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config(),
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config(),
+        on_disk_payload=settings.qdrant_on_disk,
+    )
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=schema,
+        )
+
+
+def resolve_alias(client: QdrantClient, name: str) -> str | None:
+    """Возвращает коллекцию, на которую указывает алиас `name`, или None."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+
+def collection_exists(client: QdrantClient, name: str) -> bool:
+    return client.collection_exists(name) or resolve_alias(client, name) is not None
@@ -1,49 +1,195 @@
-from qdrant_client import QdrantClient, models
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from langchain_core.documents import Document
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain_qdrant import QdrantVectorStore
 from langchain.vectorstores.base import VectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from uuid import uuid4
 
 from app.configs.settings import settings
+from app.utils.metrics import metrics
+
+from . import schema
+from .batching import EmbeddingBatcher
+from .cache import EmbeddingCache, RetrievalCache, generations, normalize_query
+from .ingest import IngestStats, ingest
+
+
+class VectorStoreService:
+    """
+    Модель эмбеддингов и клиенты Qdrant, загружаемые один раз на процесс.
+
+    Кодирование запросов выполняется батчами в ограниченном пуле потоков,
+    поиск — через асинхронный клиент, так что event loop бота не блокируется.
+    """
+
+    def __init__(
+        self,
+        qdrant_url: str | None,
+        embeddings_model: str,
+        workers: int = 2,
+        batch_window_ms: float = 5,
+        batch_size: int = 32,
+    ):
+        self.qdrant_url = qdrant_url
+        self.embeddings_model = embeddings_model
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embeddings")
+        self.batcher = EmbeddingBatcher(
+            lambda texts: self.embeddings.embed_documents(texts),
+            self.executor,
+            window_ms=batch_window_ms,
+            max_batch=batch_size,
+            max_inflight=workers,
+        )
+        self.embedding_cache = EmbeddingCache(
+            embeddings_model,
+            maxsize=settings.rag_embedding_cache_size,
+            use_redis=settings.rag_embedding_cache_redis,
+        )
+        self.retrieval_cache = RetrievalCache(
+            maxsize=settings.rag_retrieval_cache_size,
+            ttl=settings.rag_retrieval_cache_ttl_sec,
+        )
+        self._embeddings: HuggingFaceEmbeddings | None = None
+        self._client: QdrantClient | None = None
+        self._aclient: AsyncQdrantClient | None = None
+        self._stores: dict[str, QdrantVectorStore] = {}
+        self._collections: set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = HuggingFaceEmbeddings(model_name=self.embeddings_model)
+        return self._embeddings
+
+    @property
+    def client(self) -> QdrantClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = QdrantClient(url=self.qdrant_url)
+        return self._client
+
+    @property
+    def aclient(self) -> AsyncQdrantClient:
+        if self._aclient is None:
+            self._aclient = AsyncQdrantClient(url=self.qdrant_url)
+        return self._aclient
+
+    def ensure_collection(self, collection_name: str) -> None:
+        if collection_name in self._collections:
+            return
+        if not schema.collection_exists(self.client, collection_name):
+            schema.create_collection(self.client, collection_name)
+        self._collections.add(collection_name)
+
+    def get_store(self, collection_name: str) -> QdrantVectorStore:
+        store = self._stores.get(collection_name)
+        if store is None:
+            self.ensure_collection(collection_name)
+            store = QdrantVectorStore(
+                client=self.client,
+                embedding=self.embeddings,
+                collection_name=collection_name,
+                validate_collection_config=False,
+            )
+            self._stores[collection_name] = store
+        return store
+
+    def warmup(self, collection_name: str) -> None:
+        """Загружает модель и проверяет коллекцию заранее, а не на первом запросе."""
+        self.embeddings.embed_query("warmup")
+        self.ensure_collection(collection_name)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        with metrics.timer("rag.embed_sec"):
+            return await self.batcher.embed(text)
+
+    async def aembed_cached(self, query: str) -> list[float]:
+        """Вектор запроса через кеш эмбеддингов."""
+        key = normalize_query(query)
+        vector = await self.embedding_cache.get(key)
+        if vector is None:
+            vector = await self.aembed_query(query)
+            await self.embedding_cache.set(key, vector)
+        return vector
+
+    async def asearch_points(
+        self,
+        query: str,
+        k: int,
+        collection_name: str,
+        with_vectors: bool = False,
+    ) -> tuple[list[float], list[models.ScoredPoint]]:
+        """Возвращает вектор запроса и `k` ближайших точек коллекции."""
+        with metrics.timer("rag.search_sec"):
+            if collection_name not in self._collections:
+                await asyncio.to_thread(self.ensure_collection, collection_name)
+
+            vector = await self.aembed_cached(query)
+            generation = await generations.current(collection_name)
+            points = self.retrieval_cache.get(collection_name, generation, vector, k, with_vectors)
+            if points is not None:
+                return vector, points
+
+            with metrics.timer("rag.qdrant_sec"):
+                response = await self.aclient.query_points(
+                    collection_name=collection_name,
+                    query=vector,
+                    limit=k,
+                    with_payload=True,
+                    with_vectors=with_vectors,
+                    search_params=schema.search_params(),
+                )
+            points = response.points
+            self.retrieval_cache.set(collection_name, generation, vector, k, with_vectors, points)
+        return vector, points
+
+    async def asearch(self, query: str, k: int, collection_name: str) -> list[Document]:
+        _, points = await self.asearch_points(query, k, collection_name)
+        return [self.to_document(point) for point in points]
+
+    @staticmethod
+    def to_document(point: models.ScoredPoint) -> Document:
+        payload = point.payload or {}
+        return Document(
+            id=str(point.id),
+            page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+            metadata=payload.get(QdrantVectorStore.METADATA_KEY) or {},
+        )
+
+    async def aclose(self) -> None:
+        await self.batcher.aclose()
+        if self._aclient is not None:
+            await self._aclient.close()
+            self._aclient = None
+        self.executor.shutdown(wait=False)
+
+
+vector_service = VectorStoreService(
+    settings.qdrant_url,
+    settings.embeddings_model,
+    workers=settings.embeddings_workers,
+    batch_window_ms=settings.embeddings_batch_window_ms,
+    batch_size=settings.embeddings_batch_size,
+)
 
 
 def get_store(collection_name: str) -> VectorStore:
-    qdrant = QdrantClient(url=settings.qdrant_url)
-    embeddings = HuggingFaceEmbeddings(model_name=settings.embeddings_model)
-    if not qdrant.collection_exists(collection_name):
-        qdrant.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                "size": 768,
-                "distance": models.Distance.COSINE
-            }
-    )
-    return QdrantVectorStore(
-        client=qdrant,
-        embedding=embeddings,
-        collection_name=collection_name
-    )
+    return vector_service.get_store(collection_name)
 
 
-def load_to_store(vectorstore: VectorStore, contents: list[str]):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=200,
-        chunk_overlap=20,
-        separators=["\n\n", "\n", "."]
-    )
-    texts = []
-    metadatas = []
-    ids = []
-
-    for content in contents:
-        chunks = splitter.split_text(content)
-        for j, chunk in enumerate(chunks):
-            texts.append(chunk)
-            metadatas.append({"chunk": j})
-            ids.append(uuid4().hex)
-    vectorstore.add_texts(
-        texts=texts,
-        metadatas=metadatas,
-        ids=ids,
+def load_to_store(vectorstore: VectorStore, contents: Iterable[str | Document], source: str = "") -> IngestStats:
+    return ingest(
+        vectorstore,
+        contents,
+        source,
+        batch_size=settings.ingest_batch_size,
+        prune=bool(source),
     )
@@ -1,9 +1,44 @@
 ﻿import asyncio
 import logging
+import multiprocessing
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from app.configs.settings import settings
 from app.bots import command_router, mcp_router
+from app.bots.mcp_router import dispatcher
+from app.bots.middlewares import UpdateDeduplicationMiddleware
+from app.agent.agent import agent_holder
+from app.vectordb.store import vector_service
+from app.memory.pool import close_redis
+
+
+async def on_startup() -> None:
+    try:
+        await asyncio.to_thread(vector_service.warmup, settings.collection_name)
+    except Exception:
+        logging.exception("Vector store warmup failed")
+    await agent_holder.start()
+
+
+async def on_shutdown() -> None:
+    await dispatcher.drain(settings.shutdown_drain_sec)
+    await agent_holder.stop()
+    await vector_service.aclose()
+    await close_redis()
+
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    if settings.redis_url:
+        dp.update.outer_middleware(UpdateDeduplicationMiddleware(settings.update_dedup_ttl_sec))
+    dp.include_router(command_router)
+    dp.include_router(mcp_router)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
 
 
 async def main() -> None:
@@ -11,14 +46,82 @@ async def main() -> None:
     if not settings.bot_token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
     bot = Bot(settings.bot_token)
-    dp = Dispatcher()
-    dp.include_router(command_router)
-    dp.include_router(mcp_router)
+    dp = create_dispatcher()
+    # polling не работает, пока у бота установлен вебхук
+    await bot.delete_webhook()
     logging.info("Bot starting")
     await dp.start_polling(bot)
-        
 
-if __name__ == "__main__":
+
+async def set_webhook() -> None:
+    bot = Bot(settings.bot_token)
+    try:
+        await bot.set_webhook(
+            f"{settings.webhook_url.rstrip('/')}{settings.webhook_path}",
+            secret_token=settings.webhook_secret,
+        )
+    finally:
+        await bot.session.close()
+
+
+def run_webhook_worker() -> None:
     logging.basicConfig(level=logging.ERROR)
-    asyncio.run(main())
+    bot = Bot(settings.bot_token)
+    dp = create_dispatcher()
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.webhook_secret,
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot)
+    web.run_app(
+        app,
+        host=settings.webhook_host,
+        port=settings.webhook_port,
+        reuse_port=settings.webhook_workers > 1,
+        print=None,
+    )
+
+
+def run_webhook() -> None:
+    """
+    Вебхук на aiohttp в `WEBHOOK_WORKERS` процессах, слушающих один порт (SO_REUSEPORT).
+
+    Для нескольких контейнеров за балансировщиком достаточно одного воркера на контейнер:
+    повторы update отсекает UpdateDeduplicationMiddleware через Redis.
+    """
+    if not settings.bot_token:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
+    if not settings.webhook_url:
+        raise RuntimeError("WEBHOOK_URL is not set")
+    asyncio.run(set_webhook())
+    if settings.webhook_workers <= 1:
+        run_webhook_worker()
+        return
+
+    workers = [
+        multiprocessing.Process(target=run_webhook_worker, name=f"webhook-{i}")
+        for i in range(settings.webhook_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop(signum, frame):
+        # каждый воркер сам дожидается начатых ответов в on_shutdown
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for worker in workers:
+        worker.join()
 
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    if settings.bot_mode == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,540 @@
+"""
+Сквозной замер задержки и пропускной способности бота на локальных заглушках.
+
+Сообщения идут через `mcp_handler` — диспетчер, агент, память, RAG, MCP —
+а все внешнее заменено: Mistral — моделью с заданной задержкой и сценарием
+вызова инструментов, MCP серверы — `scripts.bench_stubs`, Redis — fakeredis
+(или локальный Redis через --redis-url), Qdrant — in-memory клиентом
+с детерминированными эмбеддингами, Telegram — объектами с задержкой на ответ.
+
+Каждый уровень параллельности — столько же чатов, в каждом `-n` сообщений
+подряд, следующее после ответа на предыдущее. Для уровня печатаются сообщений
+в секунду и p50/p95/p99 по стадиям из реестра метрик; --out пишет то же в JSON,
+--baseline сравнивает с прошлым прогоном и завершается с кодом 1 при регрессии.
+
+    python -m scripts.bench_e2e -c 1 4 16 -n 10 --out bench.json
+    python -m scripts.bench_e2e --llm-latency-ms 800 --baseline bench.json
+    python -m scripts.bench_e2e --workload messages.txt --redis-url redis://localhost:6379/15
+
+Настройки бота (AGENT_MAX_CONCURRENCY, STREAM_EDIT_INTERVAL_SEC, RAG_RERANK, ...)
+берутся из окружения как обычно.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+
+ROOT = Path(__file__).resolve().parents[1]
+STUBS = ("calendar", "mail", "sheet")
+
+TEMPLATES = [
+    "Найди рецепт {dish}",
+    "Как приготовить {dish}? Нужен рецепт на {count} порций",
+    "Что в отчете за {quarter} квартал про {topic}?",
+    "Какие у меня встречи на {day}?",
+    "Есть ли новая почта от {person}?",
+    "Посчитай строки в таблице продаж за {month}",
+    "Какие встречи на {day} и есть ли почта от {person}?",
+    "Привет! Спасибо за помощь",
+]
+WORDS = {
+    "dish": ["блинов", "борща", "сырников", "плова", "оливье", "пельменей", "шарлотки"],
+    "count": ["2", "4", "6"],
+    "quarter": ["первый", "второй", "третий", "четвертый"],
+    "topic": ["продажи", "расходы", "найм", "маркетинг"],
+    "day": ["сегодня", "завтра", "пятницу", "следующую неделю"],
+    "person": ["Иванова", "бухгалтерии", "поддержки", "Марии"],
+    "month": ["январь", "март", "июнь", "сентябрь"],
+}
+
+
+def default_scripts() -> dict[str, list[dict]]:
+    """Ключевое слово в вопросе -> вызовы инструментов, которые сделает модель."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "рецепт": [{"name": "knowledge_base_search", "args": {"query": "{question}"}}],
+        "отчет": [{"name": "knowledge_base_search", "args": {"query": "{question}"}}],
+        "встреч": [{"name": "get_events", "args": {"start": today.isoformat(), "end": (today + timedelta(days=7)).isoformat()}}],
+        "почт": [{"name": "search_emails", "args": {"text": "{question}", "limit": 10}}],
+        "таблиц": [{
+            "name": "get_data",
+            "args": {"spredsheet_url": "https://docs.google.com/spreadsheets/d/bench/edit", "range_name": "A1:C200"},
+        }],
+    }
+
+
+def synthetic_workload(size: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return [
+        rnd.choice(TEMPLATES).format(**{key: rnd.choice(values) for key, values in WORDS.items()})
+        for _ in range(size)
+    ]
+
+
+def knowledge_base(size: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(size):
+        if i % 2:
+            docs.append(
+                f"Рецепт {rnd.choice(WORDS['dish'])}, вариант {i}. "
+                f"Смешайте муку, яйца и молоко, готовьте {rnd.randint(5, 60)} минут на среднем огне."
+            )
+        else:
+            docs.append(
+                f"Отчет за {rnd.choice(WORDS['quarter'])} квартал, раздел {rnd.choice(WORDS['topic'])}. "
+                f"Показатель вырос на {rnd.randint(1, 40)}% к прошлому периоду, план выполнен."
+            )
+    return docs
+
+
+def start_stubs(port_base: int, latency_ms: float) -> dict[str, tuple[int, subprocess.Popen]]:
+    stubs = {}
+    for offset, name in enumerate(STUBS):
+        port = port_base + offset
+        process = subprocess.Popen(
+            [sys.executable, "-m", "scripts.bench_stubs", name, "--port", str(port), "--latency-ms", str(latency_ms)],
+            cwd=ROOT,
+        )
+        stubs[name] = (port, process)
+    for name, (port, process) in stubs.items():
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                    break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    stop_stubs(stubs)
+                    raise RuntimeError(f"MCP stub {name} did not start on port {port}")
+                time.sleep(0.2)
+    return stubs
+
+
+def stop_stubs(stubs: dict[str, tuple[int, subprocess.Popen]]) -> None:
+    for _, process in stubs.values():
+        process.terminate()
+    for _, process in stubs.values():
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def configure_env(args, stubs: dict[str, tuple[int, subprocess.Popen]]) -> None:
+    """Настройки читаются при импорте app, поэтому окружение готовится до него."""
+    for name, (port, _) in stubs.items():
+        os.environ[f"MCP_{name.upper()}_URL"] = f"http://127.0.0.1:{port}/mcp"
+        os.environ[f"MCP_{name.upper()}_TRANSPORT"] = "streamable_http"
+    os.environ["REDIS_URL"] = args.redis_url or "redis://fakeredis"
+    os.environ["MISTRAL_API_KEY"] = "bench"
+    os.environ["QDRANT_URL"] = "http://qdrant.invalid:6333"
+    os.environ["COLLECTION_NAME"] = "bench"
+    os.environ["QDRANT_VECTOR_SIZE"] = str(args.vector_size)
+    os.environ["STREAM_RESPONSES"] = "false" if args.no_stream else "true"
+
+
+def build_chat_model(args):
+    from langchain_core.language_models.chat_models import (
+        BaseChatModel,
+        agenerate_from_stream,
+        generate_from_stream,
+    )
+    from langchain_core.messages import AIMessageChunk, HumanMessage, ToolMessage
+    from langchain_core.outputs import ChatGenerationChunk
+
+    from app.utils.metrics import metrics
+
+    class ScriptedChatModel(BaseChatModel):
+        """
+        Замена ChatMistralAI.
+
+        На вопрос пользователя отвечает вызовами инструментов всех сценариев,
+        чье ключевое слово есть в вопросе, после результатов инструментов —
+        текстом из `answer_tokens` слов. До первого чанка ждет `latency`
+        секунд, между словами — `token_delay`.
+        """
+
+        scripts: dict[str, list[dict]] = {}
+        latency: float = 0.4
+        token_delay: float = 0.015
+        answer_tokens: int = 60
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _tool_calls(self, messages) -> list[dict]:
+            last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None)
+            if last_human is None or any(isinstance(m, ToolMessage) for m in messages[last_human:]):
+                return []
+            content = messages[last_human].content
+            match = re.search(r"Question:\s*(.*?)\s*Answer:", content, re.S)
+            question = match.group(1) if match else content
+            # все совпавшие сценарии сразу: несколько вызовов за шаг исполняются параллельно
+            return [
+                {
+                    "name": call["name"],
+                    "args": {k: question if v == "{question}" else v for k, v in call["args"].items()},
+                }
+                for keyword, calls in self.scripts.items()
+                if keyword in question.lower()
+                for call in calls
+            ]
+
+        def _chunks(self, messages):
+            """(пауза перед чанком, чанк)."""
+            calls = self._tool_calls(messages)
+            if calls:
+                yield self.latency, ChatGenerationChunk(message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"], ensure_ascii=False),
+                            "id": f"call_{uuid.uuid4().hex[:12]}",
+                            "index": index,
+                        }
+                        for index, call in enumerate(calls)
+                    ],
+                ))
+                return
+            for index in range(self.answer_tokens):
+                delay = self.latency if index == 0 else self.token_delay
+                yield delay, ChatGenerationChunk(message=AIMessageChunk(content=f"ответ{index} "))
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            with metrics.timer("bench.llm_sec"):
+                for delay, chunk in self._chunks(messages):
+                    time.sleep(delay)
+                    yield chunk
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            with metrics.timer("bench.llm_sec"):
+                for delay, chunk in self._chunks(messages):
+                    await asyncio.sleep(delay)
+                    yield chunk
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    scripts = default_scripts()
+    if args.scripts:
+        scripts = json.loads(Path(args.scripts).read_text(encoding="utf-8"))
+    return ScriptedChatModel(
+        scripts=scripts,
+        latency=args.llm_latency_ms / 1000,
+        token_delay=args.llm_token_ms / 1000,
+        answer_tokens=args.answer_tokens,
+    )
+
+
+def use_fakeredis() -> None:
+    try:
+        from fakeredis import FakeRedis, FakeServer
+        from fakeredis.aioredis import FakeConnection
+    except ImportError:
+        raise SystemExit("Для бенчмарка нужен fakeredis (pip install fakeredis) или локальный Redis через --redis-url")
+    import redis.asyncio as aioredis
+
+    from app.configs.settings import settings
+    from app.memory import pool, redis_memory
+
+    server = FakeServer()
+    pool._pool = aioredis.BlockingConnectionPool(
+        connection_class=FakeConnection,
+        server=server,
+        max_connections=settings.redis_pool_size,
+        timeout=settings.redis_pool_timeout_sec,
+    )
+    redis_memory._client = FakeRedis(server=server)
+
+
+async def use_memory_qdrant(args) -> None:
+    """In-memory Qdrant с синтетической базой знаний вместо сервера и модели эмбеддингов."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_qdrant import QdrantVectorStore
+    from qdrant_client import AsyncQdrantClient, models
+
+    from app.configs.settings import settings
+    from app.vectordb import schema
+    from app.vectordb.store import vector_service
+
+    class SlowFakeEmbedding(DeterministicFakeEmbedding):
+        """Детерминированные векторы; `delay` — время одного прохода модели на батч."""
+
+        delay: float = 0.0
+
+        def embed_documents(self, texts: list[str]) -> list[list[float]]:
+            time.sleep(self.delay)
+            return super().embed_documents(texts)
+
+        def embed_query(self, text: str) -> list[float]:
+            time.sleep(self.delay)
+            return super().embed_query(text)
+
+    embeddings = SlowFakeEmbedding(size=args.vector_size, delay=args.embed_ms / 1000)
+    client = AsyncQdrantClient(location=":memory:")
+    collection = settings.collection_name
+    await client.create_collection(collection, vectors_config=schema.vectors_config())
+
+    docs = knowledge_base(args.docs, args.seed)
+    vectors = DeterministicFakeEmbedding(size=args.vector_size).embed_documents(docs)
+    await client.upsert(collection, points=[
+        models.PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector,
+            payload={
+                QdrantVectorStore.CONTENT_KEY: text,
+                QdrantVectorStore.METADATA_KEY: {"source": "bench", "page": 0, "chunk": i},
+            },
+        )
+        for i, (text, vector) in enumerate(zip(docs, vectors))
+    ])
+
+    vector_service._embeddings = embeddings
+    vector_service._aclient = client
+    # коллекция уже создана в клиенте, синхронный клиент не понадобится
+    vector_service._collections.add(collection)
+
+
+class SentMessage:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def edit_text(self, text: str, parse_mode: str | None = None, **kwargs) -> "SentMessage":
+        await asyncio.sleep(self.delay)
+        return self
+
+
+class FakeBot:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def send_chat_action(self, *args, **kwargs) -> bool:
+        await asyncio.sleep(self.delay)
+        return True
+
+
+class FakeMessage:
+    """Входящее сообщение Telegram: ровно то, чего касаются обработчики бота."""
+
+    def __init__(self, chat_id: int, text: str, bot: FakeBot):
+        self.chat = SimpleNamespace(id=chat_id)
+        self.text = text
+        self.bot = bot
+        self.replies: list[str] = []
+        self.submitted = 0.0
+        self.done = asyncio.get_running_loop().create_future()
+
+    async def answer(self, text: str, parse_mode: str | None = None, **kwargs) -> SentMessage:
+        self.replies.append(text)
+        await asyncio.sleep(self.bot.delay)
+        return SentMessage(self.bot.delay)
+
+
+def track(handler):
+    """Оборачивает обработчик диспетчера, чтобы знать, когда ход начался и закончился."""
+    from app.utils.metrics import metrics
+
+    async def tracked(messages: list[FakeMessage]) -> None:
+        started = time.perf_counter()
+        for message in messages:
+            metrics.histogram("bench.queue_sec").observe(started - message.submitted)
+        error = None
+        try:
+            await handler(messages)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            finished = time.perf_counter()
+            for message in messages:
+                if not message.done.done():
+                    message.done.set_result(error)
+                metrics.histogram("bench.e2e_sec").observe(finished - message.submitted)
+
+    return tracked
+
+
+async def run_level(args, workload: list[str], concurrency: int, level: int) -> dict:
+    from app.bots.mcp_router import mcp_handler
+    from app.utils.metrics import metrics
+
+    metrics.reset()
+    bot = FakeBot(args.telegram_ms / 1000)
+    rnd = random.Random(args.seed + level)
+    counts = {"completed": 0, "rejected": 0, "errors": 0}
+
+    async def chat(chat_id: int) -> None:
+        for _ in range(args.messages):
+            message = FakeMessage(chat_id, rnd.choice(workload), bot)
+            message.submitted = time.perf_counter()
+            await mcp_handler(message)
+            # принятое сообщение обработчик еще не начал; ответ уже есть только у отклоненного
+            if message.replies:
+                counts["rejected"] += 1
+            else:
+                error = await message.done
+                counts["errors" if error else "completed"] += 1
+            if args.think_ms:
+                await asyncio.sleep(rnd.expovariate(1000 / args.think_ms))
+
+    # новые id чатов на каждом уровне, чтобы история прошлого уровня не влияла
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(level * 1_000_000 + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    snapshot = metrics.snapshot()
+    return {
+        "concurrency": concurrency,
+        "messages": sum(counts.values()),
+        **counts,
+        "elapsed_sec": elapsed,
+        "msgs_per_sec": counts["completed"] / elapsed if elapsed else 0.0,
+        "stages": {name: value for name, value in snapshot.items() if isinstance(value, dict) and "p50" in value},
+        "counters": {name: value for name, value in snapshot.items() if isinstance(value, (int, float))},
+    }
+
+
+def print_level(result: dict) -> None:
+    print(
+        f"c={result['concurrency']:<3} msgs={result['messages']:<5} "
+        f"msg/s={result['msgs_per_sec']:7.2f} "
+        f"rejected={result['rejected']} errors={result['errors']}"
+    )
+    print(f"    {'stage':<34} {'n':>6} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9}")
+    for name, stage in result["stages"].items():
+        print(
+            f"    {name:<34} {stage['count']:>6} "
+            f"{stage['p50'] * 1000:9.1f} {stage['p95'] * 1000:9.1f} {stage['p99'] * 1000:9.1f}"
+        )
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии относительно прошлого прогона: p95 стадии выросла или msg/s упала больше чем на `tolerance`."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result["concurrency"])
+        if old is None:
+            continue
+        c = result["concurrency"]
+        if result["msgs_per_sec"] < old["msgs_per_sec"] * (1 - tolerance):
+            regressions.append(f"c={c} msg/s {old['msgs_per_sec']:.2f} -> {result['msgs_per_sec']:.2f}")
+        for name, stage in result["stages"].items():
+            old_stage = old["stages"].get(name)
+            if old_stage and old_stage["p95"] > 0 and stage["p95"] > old_stage["p95"] * (1 + tolerance):
+                regressions.append(
+                    f"c={c} {name} p95 {old_stage['p95'] * 1000:.1f}ms -> {stage['p95'] * 1000:.1f}ms"
+                )
+    return regressions
+
+
+async def run(args) -> list[dict]:
+    from app.agent import agent as agent_module
+    from app.agent.agent import agent_holder
+    from app.agent.prompt import summary_prompt
+    from app.bots.mcp_router import dispatcher
+    from app.memory import redis_memory
+    from app.memory.pool import close_redis
+    from app.vectordb.store import vector_service
+
+    if not args.redis_url:
+        use_fakeredis()
+    await use_memory_qdrant(args)
+
+    agent_module.llm = build_chat_model(args)
+    summary_llm = build_chat_model(args)
+    summary_llm.scripts = {}
+    redis_memory._summarizer = summary_prompt | summary_llm
+    dispatcher.handler = track(dispatcher.handler)
+
+    if args.workload:
+        lines = Path(args.workload).read_text(encoding="utf-8").splitlines()
+        workload = [line.strip() for line in lines if line.strip()]
+    else:
+        workload = synthetic_workload(200, args.seed)
+
+    await agent_holder.start()
+    results = []
+    try:
+        for level, concurrency in enumerate(args.concurrency, start=1):
+            result = await run_level(args, workload, concurrency, level)
+            print_level(result)
+            results.append(result)
+    finally:
+        await dispatcher.drain(30)
+        await agent_holder.stop()
+        await vector_service.aclose()
+        await close_redis()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="одновременных чатов")
+    parser.add_argument("-n", "--messages", type=int, default=10, help="сообщений на чат")
+    parser.add_argument("--workload", help="файл с сообщениями, по одному в строке; по умолчанию синтетические")
+    parser.add_argument("--scripts", help="JSON {ключевое слово: [{name, args}]} со сценариями вызова инструментов")
+    parser.add_argument("--think-ms", type=float, default=0, help="средняя пауза пользователя между сообщениями")
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="задержка модели до первого чанка")
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--tool-latency-ms", type=float, default=100, help="задержка инструментов MCP заглушек")
+    parser.add_argument("--telegram-ms", type=float, default=40, help="задержка вызова Telegram API")
+    parser.add_argument("--embed-ms", type=float, default=20, help="время кодирования батча эмбеддингов")
+    parser.add_argument("--docs", type=int, default=500, help="размер синтетической базы знаний")
+    parser.add_argument("--vector-size", type=int, default=384)
+    parser.add_argument("--redis-url", help="локальный Redis вместо fakeredis")
+    parser.add_argument("--no-stream", action="store_true", help="STREAM_RESPONSES=false")
+    parser.add_argument("--port-base", type=int, default=18001, help="порты MCP заглушек: base, base+1, base+2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="куда записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    stubs = start_stubs(args.port_base, args.tool_latency_ms)
+    try:
+        configure_env(args, stubs)
+        results = asyncio.run(run(args))
+    finally:
+        stop_stubs(stubs)
+
+    if args.out:
+        config = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+        Path(args.out).write_text(
+            json.dumps({"config": config, "levels": results}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
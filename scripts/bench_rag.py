@@ -0,0 +1,87 @@
+"""
+Замер задержки поиска по базе знаний.
+
+Сравнивает старый путь (клиент Qdrant и модель создаются на каждый запрос,
+поиск синхронный) с резидентным VectorStoreService.
+
+    python -m scripts.bench_rag "рецепт блинов" "отчет за квартал" -n 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from qdrant_client import QdrantClient
+from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+from langchain_qdrant import QdrantVectorStore
+
+from app.configs.settings import settings
+from app.vectordb.store import VectorStoreService
+
+
+def legacy_search(query: str, k: int) -> list:
+    qdrant = QdrantClient(url=settings.qdrant_url)
+    embeddings = HuggingFaceEmbeddings(model_name=settings.embeddings_model)
+    qdrant.collection_exists(settings.collection_name)
+    store = QdrantVectorStore(client=qdrant, embedding=embeddings, collection_name=settings.collection_name)
+    return store.as_retriever(search_kwargs={"k": k}).invoke(query)
+
+
+def report(name: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    print(
+        f"{name:<10} n={len(samples):<4} "
+        f"p50={statistics.median(samples) * 1000:8.1f}ms "
+        f"p95={p95 * 1000:8.1f}ms "
+        f"max={ordered[-1] * 1000:8.1f}ms"
+    )
+
+
+async def bench_service(queries: list[str], k: int, concurrency: int) -> list[float]:
+    service = VectorStoreService(
+        settings.qdrant_url,
+        settings.embeddings_model,
+        workers=settings.embeddings_workers,
+        batch_window_ms=settings.embeddings_batch_window_ms,
+        batch_size=settings.embeddings_batch_size,
+    )
+    await asyncio.to_thread(service.warmup, settings.collection_name)
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await service.asearch(query, k, settings.collection_name)
+            samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(q) for q in queries))
+    await service.aclose()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG latency benchmark")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("-n", "--repeat", type=int, default=10)
+    parser.add_argument("-k", type=int, default=15)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    queries = args.queries * args.repeat
+
+    if not args.skip_legacy:
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            legacy_search(query, args.k)
+            samples.append(time.perf_counter() - start)
+        report("legacy", samples)
+
+    report("service", asyncio.run(bench_service(queries, args.k, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Заглушки MCP серверов календаря, почты и таблиц для нагрузочных тестов.
+
+Список инструментов, их аргументы со значениями по умолчанию и описания
+берутся из `servers/<сервер>/main.py` разбором исходника, так что модель видит
+то же, что в проде. Отвечают заглушки фиксированными данными после задержки
+`--latency-ms`, не обращаясь к Google. Типы из модулей сервера (Event, Filter,
+OutgoingEmail) заменяются на dict — импортировать сам сервер с его
+зависимостями не нужно.
+
+    python -m scripts.bench_stubs calendar --port 18001 --latency-ms 80
+"""
+import argparse
+import ast
+import asyncio
+import builtins
+import random
+import typing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from mcp.server.fastmcp import FastMCP
+
+
+SERVERS_DIR = Path(__file__).resolve().parents[1] / "servers"
+SERVERS = ("calendar", "mail", "sheet")
+
+# имена, которые могут встретиться в аннотациях инструментов; прочие станут dict
+KNOWN_NAMES = {
+    "date": date,
+    "datetime": datetime,
+    **{name: getattr(typing, name) for name in ("Any", "Dict", "List", "Literal", "Optional", "Union")},
+}
+
+
+def _events(start: datetime, count: int) -> list[dict]:
+    return [
+        {
+            "id": f"evt{i}",
+            "name": f"Встреча {i}",
+            "start": (start + timedelta(hours=2 * i)).isoformat(),
+            "end": (start + timedelta(hours=2 * i + 1)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+
+
+def _email(uid: int) -> dict:
+    return {
+        "uid": uid,
+        "from": f"sender{uid}@example.com",
+        "to": "me@example.com",
+        "subject": f"Письмо {uid}",
+        "date": datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0300"),
+        "body": "Добрый день! Пересылаю отчет за квартал, посмотрите, пожалуйста.",
+    }
+
+
+def _rows(cursor: int, limit: int) -> list[list[str]]:
+    return [[f"Товар {i}", str(i * 10), str(i * 125)] for i in range(cursor, cursor + limit)]
+
+
+# инструмент -> ответ по аргументам вызова в той же форме, что у настоящего сервера;
+# у остальных — {"message": "<имя> ok"}
+RESPONSES = {
+    "get_events": lambda a: {"events": _events(a["start"], 6)},
+    "get_today_events": lambda a: {"events": _events(_today(), 4)},
+    "get_tomorrow_events": lambda a: {"events": _events(_today() + timedelta(days=1), 3)},
+    "add_event": lambda a: {"message": "Event added"},
+    "add_events": lambda a: {"results": [{"status": "ok", "id": f"new{i}"} for i, _ in enumerate(a["events"])]},
+    "delete_events": lambda a: {"results": [{"id": event_id, "status": "ok"} for event_id in a["event_ids"]]},
+    "find_free_slots": lambda a: {
+        "slots": [
+            {
+                "start": (a["start"] + timedelta(hours=i)).isoformat(),
+                "end": (a["start"] + timedelta(hours=i, minutes=a["duration_minutes"])).isoformat(),
+            }
+            for i in range(3)
+        ]
+    },
+    "send_email": lambda a: {"message": f"Email sent to {a['to']}"},
+    "send_emails": lambda a: {"results": [{"to": m.get("to"), "status": "sent"} for m in a["messages"]]},
+    "send_email_with_attachments": lambda a: {"message": f"Email sent to {a['to']}"},
+    "recieve_emails": lambda a: {"emails": [_email(uid) for uid in range(a["limit"], 0, -1)]},
+    "list_attachments": lambda a: {
+        "files": [{"name": "report.pdf", "size": 245_000, "mime": "application/pdf", "too_large": False}]
+    },
+    "search_emails": lambda a: {
+        "emails": [_email(uid) for uid in range(a["cursor"] + 1, a["cursor"] + a["limit"] + 1)],
+        "total": 42,
+        "next_cursor": a["cursor"] + a["limit"] if a["cursor"] + a["limit"] < 42 else None,
+    },
+    "get_email": lambda a: {**_email(a["uid"]), "body": "Текст письма. " * 50},
+    "get_data": lambda a: (
+        {"aggregate": a["aggregate"], "column": a["aggregate_column"], "rows_matched": 500, "value": 500}
+        if a["aggregate"]
+        else {"header": ["name", "qty", "price"], "rows": _rows(a["cursor"], max(0, min(a["limit"], 500 - a["cursor"]))), "total": 500,
+              "next_cursor": a["cursor"] + a["limit"] if a["cursor"] + a["limit"] < 500 else None}
+    ),
+    "batch_get": lambda a: {name: [["name", "qty"], *_rows(0, 20)] for name in a["ranges"]},
+    "set_data": lambda a: {"message": "Data successfully set"},
+    "batch_update": lambda a: {"message": f"Updated {20 * len(a['data'])} cells in {len(a['data'])} ranges"},
+    "append_data": lambda a: {"message": "Data appended"},
+    "clear_data": lambda a: {"message": "Data cleared"},
+}
+
+
+def _is_tool(decorator: ast.expr) -> bool:
+    target = decorator.func if isinstance(decorator, ast.Call) else decorator
+    return isinstance(target, ast.Attribute) and target.attr == "tool"
+
+
+def real_tools(server: str) -> list[ast.FunctionDef | ast.AsyncFunctionDef]:
+    """Функции с декоратором `@mcp.tool()` из main.py сервера."""
+    tree = ast.parse((SERVERS_DIR / server / "main.py").read_text(encoding="utf-8"))
+    return [
+        node
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and any(map(_is_tool, node.decorator_list))
+    ]
+
+
+def stub_tool(node: ast.FunctionDef | ast.AsyncFunctionDef, respond):
+    """Асинхронная функция с сигнатурой и описанием инструмента `node`, отвечающая через `respond`."""
+    namespace = {"_respond": respond}
+    for child in ast.walk(node.args):
+        if isinstance(child, ast.Name) and not hasattr(builtins, child.id):
+            namespace.setdefault(child.id, KNOWN_NAMES.get(child.id, dict))
+
+    source = f"async def {node.name}({ast.unparse(node.args)}):\n    return await _respond({node.name!r}, locals())\n"
+    exec(compile(source, f"<stub {node.name}>", "exec"), namespace)
+    function = namespace[node.name]
+    function.__doc__ = ast.get_docstring(node)
+    return function
+
+
+def build_server(server: str, latency: float, jitter: float) -> FastMCP:
+    mcp = FastMCP(server)
+
+    async def respond(name: str, arguments: dict):
+        await asyncio.sleep(max(0.0, random.gauss(latency, latency * jitter)))
+        answer = RESPONSES.get(name)
+        return answer(arguments) if answer else {"message": f"{name} ok"}
+
+    for node in real_tools(server):
+        mcp.tool()(stub_tool(node, respond))
+    return mcp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("server", choices=SERVERS)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter", type=float, default=0.2, help="разброс задержки, доля от среднего")
+    args = parser.parse_args()
+
+    mcp = build_server(args.server, args.latency_ms / 1000, args.jitter)
+    mcp.settings.port = args.port
+    mcp.settings.host = args.host
+    mcp.settings.log_level = "WARNING"
+    mcp.run(transport="streamable-http")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Офлайн оценка сборки контекста для базы знаний.
+
+Файл с вопросами — jsonl, по строке на вопрос:
+    {"question": "Как приготовить блины?", "answers": ["мука", "молоко", "яйца"]}
+
+`answers` — фрагменты текста, которые должны попасть в контекст. Для каждого
+режима считается доля найденных фрагментов (recall) и размер контекста в токенах.
+
+    python -m scripts.eval_rag questions.jsonl --out eval.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.configs.settings import settings
+from app.utils.tokens import estimate_tokens
+from app.vectordb.context import assemble_context
+from app.vectordb.store import vector_service
+
+
+async def raw_context(question: str) -> str:
+    docs = await vector_service.asearch(question, 15, settings.collection_name)
+    return "\n\n".join(d.page_content for d in docs)
+
+
+def recall(context: str, answers: list[str]) -> float:
+    if not answers:
+        return 1.0
+    context = context.lower()
+    return sum(answer.lower() in context for answer in answers) / len(answers)
+
+
+async def evaluate(questions: list[dict], modes: dict) -> dict:
+    results = {}
+    for name, build in modes.items():
+        rows = []
+        for item in questions:
+            start = time.perf_counter()
+            context = await build(item["question"])
+            rows.append({
+                "question": item["question"],
+                "recall": recall(context, item.get("answers", [])),
+                "tokens": estimate_tokens(context),
+                "latency_sec": time.perf_counter() - start,
+            })
+        results[name] = {
+            "recall": statistics.mean(r["recall"] for r in rows),
+            "tokens": statistics.mean(r["tokens"] for r in rows),
+            "latency_sec": statistics.median(r["latency_sec"] for r in rows),
+            "rows": rows,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG context evaluation")
+    parser.add_argument("questions")
+    parser.add_argument("--budget", type=int, default=settings.rag_context_tokens)
+    parser.add_argument("--candidates", type=int, default=settings.rag_candidates)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    modes = {"raw": raw_context}
+    for rerank in ("none", "mmr", "cross-encoder"):
+        modes[rerank] = lambda q, rerank=rerank: assemble_context(
+            vector_service, q, settings.collection_name,
+            candidates=args.candidates, budget=args.budget, rerank=rerank,
+        )
+
+    results = asyncio.run(evaluate(questions, modes))
+    for name, result in results.items():
+        print(
+            f"{name:<14} recall={result['recall']:.3f} "
+            f"tokens={result['tokens']:7.1f} latency={result['latency_sec'] * 1000:7.1f}ms"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Нагрузочный тест MCP сервера календаря.
+
+Для каждого уровня параллельности открывает столько же MCP сессий и гоняет
+через них вызовы инструмента, печатая пропускную способность и задержки.
+Если сервер не блокирует цикл событий, вызовов в секунду становится больше
+с ростом параллельности, пока не упремся в CALENDAR_WORKERS или квоты Google.
+
+    python -m scripts.load_calendar -c 1 2 4 8 16 -n 20
+    python -m scripts.load_calendar --tool get_today_events
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from app.configs.settings import settings
+
+
+def tool_arguments(tool: str) -> dict:
+    if tool == "get_events":
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return {"start": start.isoformat(), "end": (start + timedelta(days=7)).isoformat()}
+    if tool == "find_free_slots":
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        return {"start": start.isoformat(), "end": (start + timedelta(days=3)).isoformat(), "duration_minutes": 60}
+    return {}
+
+
+async def worker(url: str, tool: str, arguments: dict, calls: int, samples: list[float], errors: list[str]) -> None:
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(calls):
+                start = time.perf_counter()
+                result = await session.call_tool(tool, arguments)
+                samples.append(time.perf_counter() - start)
+                if result.isError:
+                    errors.append(str(result.content))
+
+
+async def run_level(url: str, tool: str, concurrency: int, calls: int) -> None:
+    samples: list[float] = []
+    errors: list[str] = []
+    arguments = tool_arguments(tool)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(url, tool, arguments, calls, samples, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    print(
+        f"c={concurrency:<3} calls={len(samples):<5} "
+        f"rps={len(samples) / elapsed:7.1f} "
+        f"p50={statistics.median(samples) * 1000:8.1f}ms "
+        f"p95={p95 * 1000:8.1f}ms "
+        f"errors={len(errors)}"
+    )
+    if errors:
+        print(f"    first error: {errors[0][:200]}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=settings.mcp_calendar.url or "http://localhost:8001/mcp")
+    parser.add_argument("--tool", default="get_events")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("-n", "--calls", type=int, default=20, help="вызовов на сессию")
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        await run_level(args.url, args.tool, concurrency, args.calls)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
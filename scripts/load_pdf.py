@@ -1,26 +1,47 @@
 from langchain_community.document_loaders import PyPDFLoader
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import glob
 import os
+import sys
 
 from app.configs.settings import settings
 from app.vectordb.store import get_store, load_to_store
 
 
-def load_pdf_to_store(pdf_path: str):
+def load_pdf_to_store(pdf_path: str, root: str | None = None):
+    """
+    `source` документа — путь относительно корня загрузки: по нему удаляются
+    устаревшие чанки, так что у одноименных файлов из разных папок он разный.
+    """
     loader = PyPDFLoader(pdf_path)
-    docs = loader.load()
     store = get_store(settings.collection_name)
-    contents = [doc.page_content for doc in docs]
-    load_to_store(store, contents)
+    source = os.path.relpath(pdf_path, root or os.path.dirname(pdf_path)).replace(os.sep, "/")
+    return load_to_store(store, loader.lazy_load(), source=source)
+
+
+def load_dir_to_store(dir_path: str, workers: int = settings.ingest_workers):
+    pdf_paths = sorted(glob.glob(os.path.join(dir_path, "**", "*.pdf"), recursive=True))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, stats in zip(pdf_paths, pool.map(partial(load_pdf_to_store, root=dir_path), pdf_paths)):
+            print(f"{path}: добавлено {stats.added}, без изменений {stats.skipped}, удалено {stats.deleted}")
 
 
 def main():
-    pdf_path = input("Введите абсолютный путь до pdf файла: ")
+    if len(sys.argv) > 1:
+        pdf_path = sys.argv[1]
+    else:
+        pdf_path = input("Введите абсолютный путь до pdf файла или директории: ")
     if not os.path.exists(pdf_path):
-        print("Файл не найден. Проверьте путь")
+        print("Файл не найден. Проверьте путь")
         return
-    load_pdf_to_store(pdf_path)
+    if os.path.isdir(pdf_path):
+        load_dir_to_store(pdf_path)
+    else:
+        stats = load_pdf_to_store(pdf_path)
+        print(f"Добавлено {stats.added}, без изменений {stats.skipped}, удалено {stats.deleted}")
     print("Загрузка завершена")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
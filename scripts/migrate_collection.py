@@ -0,0 +1,111 @@
+"""
+Перестраивает коллекцию по текущей схеме из настроек (квантизация, HNSW,
+хранение на диске, индексы payload) и переключает на нее алиас.
+
+    python -m scripts.migrate_collection --drop-old
+
+Коллекция `COLLECTION_NAME` после миграции — алиас на `<name>_v<N>`.
+Если сейчас это обычная коллекция, а не алиас, ее придется удалить перед
+созданием алиаса с тем же именем: в этот момент поиск на пару секунд недоступен.
+Загрузку pdf во время миграции запускать не нужно — записи в старую коллекцию не переносятся.
+"""
+import argparse
+import re
+
+from qdrant_client import models
+
+from app.configs.settings import settings
+from app.vectordb import schema
+from app.vectordb.cache import generations
+from app.vectordb.store import vector_service
+
+
+def next_version_name(client, name: str) -> str:
+    pattern = re.compile(rf"^{re.escape(name)}_v(\d+)$")
+    versions = [
+        int(match.group(1))
+        for collection in client.get_collections().collections
+        if (match := pattern.match(collection.name))
+    ]
+    return f"{name}_v{max(versions, default=0) + 1}"
+
+
+def copy_points(client, source: str, target: str, batch_size: int) -> int:
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                    for point in points
+                ],
+                wait=True,
+            )
+            copied += len(points)
+            print(f"Скопировано {copied}")
+        if offset is None:
+            return copied
+
+
+def switch_alias(client, alias: str, target: str) -> str | None:
+    """Атомарно переводит алиас на `target`. Возвращает коллекцию, на которую он указывал."""
+    current = schema.resolve_alias(client, alias)
+    operations = []
+    if current is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    elif client.collection_exists(alias):
+        # алиас не может совпадать по имени с коллекцией
+        client.delete_collection(alias)
+    operations.append(
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=target, alias_name=alias)
+        )
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a Qdrant collection with the configured schema")
+    parser.add_argument("--collection", default=settings.collection_name)
+    parser.add_argument("--target", help="имя новой коллекции, по умолчанию <collection>_v<N>")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--drop-old", action="store_true", help="удалить старую коллекцию за алиасом")
+    args = parser.parse_args()
+
+    client = vector_service.client
+    name = args.collection
+    source = schema.resolve_alias(client, name) or name
+    if not client.collection_exists(source):
+        print(f"Коллекция {name} не найдена")
+        return
+
+    target = args.target or next_version_name(client, name)
+    print(f"{source} -> {target}")
+    schema.create_collection(client, target)
+
+    copied = copy_points(client, source, target, args.batch_size)
+    expected = client.count(source, exact=True).count
+    if copied != expected:
+        raise RuntimeError(f"Скопировано {copied} из {expected} точек, алиас не переключен")
+
+    previous = switch_alias(client, name, target)
+    generations.bump(name)
+    print(f"Алиас {name} -> {target}")
+
+    if args.drop_old and previous is not None:
+        client.delete_collection(previous)
+        print(f"Удалена {previous}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ async def set_commands() -> None:
     commands = [
         BotCommand(command="help", description="Help"),
         BotCommand(command="health", description="Healthcheck"),
+        BotCommand(command="metrics", description="Runtime metrics"),
     ]
     await bot.set_my_commands(commands)
 
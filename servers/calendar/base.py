@@ -5,12 +5,16 @@ from datetime import datetime
 
 
 class Event(BaseModel):
-    name: str = Field(str, description="Название события")
-    start: datetime = Field(datetime, description="Дата начала события")
-    end: datetime = Field(datetime, description="Дата окончания события")
+    id: str | None = Field(None, description="Идентификатор события")
+    name: str = Field(..., description="Название события")
+    start: datetime = Field(..., description="Дата начала события")
+    end: datetime = Field(..., description="Дата окончания события")
 
 
 class CalendarService(ABC):
+    @abstractmethod
+    def get_events(self, start: datetime, end: datetime) -> list[Event]: ...
+
     @abstractmethod
     def get_today_events(self) -> list[Event]: ...
 
@@ -18,4 +22,13 @@ class CalendarService(ABC):
     def get_tomorrow_events(self):...
 
     @abstractmethod
-    def add_event(self, name: str, start: datetime, end: datetime): ...
\ No newline at end of file
+    def add_event(self, name: str, start: datetime, end: datetime): ...
+
+    @abstractmethod
+    def add_events(self, events: list[Event]): ...
+
+    @abstractmethod
+    def delete_events(self, event_ids: list[str]): ...
+
+    @abstractmethod
+    def find_free_slots(self, start: datetime, end: datetime, duration_minutes: int): ...
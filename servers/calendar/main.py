@@ -1,26 +1,53 @@
 from mcp.server.fastmcp import FastMCP
+from base import Event
 from service import GoogleCalendarService
 
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 mcp = FastMCP("calendar")
 calendar_service = GoogleCalendarService()
 
+# клиент Google блокирующий: вызовы идут в ограниченный пул, а цикл событий свободен
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("CALENDAR_WORKERS", "8")), thread_name_prefix="calendar")
+
+
+async def run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
 
 @mcp.tool()
-def get_today_events():
+async def get_events(start: datetime, end: datetime):
+    """
+    Get the events that overlap the given period, e.g. a week or a month.
+
+    :param start: The start of the period in ISO 8601 format
+    :param end: The end of the period in ISO 8601 format
+    :return: A dictionary with the key "events" containing the events ordered by start time
+    :rtype: Dict[str, List[Dict[str, date | str]]]
+    """
+    events = await run(calendar_service.get_events, start, end)
+    return {"events": events}
+
+
+@mcp.tool()
+async def get_today_events():
     """
     Get the events happening today.
 
     Returns:
         dict: A dictionary containing the events for today. The dictionary has a key "events" with the retrieved events as its value.
     """
-    events = calendar_service.get_today_events()
+    events = await run(calendar_service.get_today_events)
     return {"events": events}
 
 
 @mcp.tool()
-def get_tomorrow_events():
+async def get_tomorrow_events():
     
     """
     Returns a list of events for tomorrow from the main calendar.
@@ -28,11 +55,11 @@ def get_tomorrow_events():
     :return: A dictionary containing a list of events for tomorrow
     :rtype: Dict[str, List[Dict[str, date | str]]]
     """
-    events = calendar_service.get_tomorrow_events()
+    events = await run(calendar_service.get_tomorrow_events)
     return {"events": events}
 
 @mcp.tool()
-def add_event(name: str, start: datetime, end: datetime):
+async def add_event(name: str, start: datetime, end: datetime):
     
     """
     Adds an event to the main calendar.
@@ -44,11 +71,51 @@ def add_event(name: str, start: datetime, end: datetime):
     :rtype: Dict[str, str]
     """
     print(name, start, end)
-    calendar_service.add_event(name, start, end)
+    await run(calendar_service.add_event, name, start, end)
 
     return {"message": "Event added"}
 
 
+@mcp.tool()
+async def add_events(events: list[Event]):
+    """
+    Adds several events to the main calendar in one request. Use it instead of calling add_event in a loop.
+
+    :param events: The events to add, each with name, start and end in ISO 8601 format
+    :return: A dictionary with the key "results" containing the status of every event and its id or error
+    :rtype: Dict[str, List[Dict[str, str]]]
+    """
+    return {"results": await run(calendar_service.add_events, events)}
+
+
+@mcp.tool()
+async def delete_events(event_ids: list[str]):
+    """
+    Deletes several events from the main calendar in one request.
+
+    :param event_ids: The ids of the events, as returned by get_events
+    :return: A dictionary with the key "results" containing the status of every event
+    :rtype: Dict[str, List[Dict[str, str]]]
+    """
+    return {"results": await run(calendar_service.delete_events, event_ids)}
+
+
+@mcp.tool()
+async def find_free_slots(start: datetime, end: datetime, duration_minutes: int, day_start_hour: int = 9, day_end_hour: int = 19):
+    """
+    Finds free time slots in the main calendar. Use it instead of loading events to look for gaps.
+
+    :param start: The start of the search period in ISO 8601 format
+    :param end: The end of the search period in ISO 8601 format
+    :param duration_minutes: The minimal length of a slot in minutes
+    :param day_start_hour: The hour working day starts
+    :param day_end_hour: The hour working day ends
+    :return: A dictionary with the key "slots" containing free intervals with start and end
+    :rtype: Dict[str, List[Dict[str, str]]]
+    """
+    return {"slots": await run(calendar_service.find_free_slots, start, end, duration_minutes, day_start_hour, day_end_hour)}
+
+
 if __name__ == '__main__':
     # from datetime import timedelta
     # res = calendar_service.add_event("test", datetime.now(), datetime.now() + timedelta(days=1))
@@ -4,25 +4,49 @@ import os.path
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+import httplib2
 
 import datetime
+import threading
+import time
 from datetime import date, datetime, timedelta, timezone
 import pytz
 from typing import List
 
 from base import CalendarService, Event
+from store import EventStore
 
 class GoogleCalendarService(CalendarService):
+    """
+    Клиент Google Calendar с локальной копией событий.
+
+    Копия обновляется инкрементально по `syncToken` не чаще раза в `sync_interval`
+    секунд, так что повторные вопросы о расписании стоят одного короткого запроса
+    изменений. Хранятся события, закончившиеся не раньше `history_days` дней назад;
+    более старые диапазоны запрашиваются у API напрямую.
+
+    Методы вызываются из пула потоков. httplib2 не потокобезопасен, поэтому у каждого
+    потока свой авторизованный транспорт с keep-alive соединением к API.
+    """
+
     SCOPES = ["https://www.googleapis.com/auth/calendar"]
+    PAGE_SIZE = 2500
+    BATCH_SIZE = 50  # предел Calendar API на один batch запрос
 
-    def __init__(self, credentials_file="credentials.json", token_file="token.json"):
+    def __init__(self, credentials_file="credentials.json", token_file="token.json", sync_interval: float = 10, history_days: int = 90):
         self.credentials_file = credentials_file
         self.token_file = token_file
         self.creds = None
         self.service = None
-        self.events = {} # name: event_id
         self.timezone = pytz.timezone("Europe/Moscow")
+        self.store = EventStore(self.timezone)
+        self.sync_interval = sync_interval
+        self.history_days = history_days
+        self._synced_at = 0.0
+        self._local = threading.local()
         self._authenticate()
 
     def _authenticate(self):
@@ -41,38 +65,93 @@ class GoogleCalendarService(CalendarService):
 
         self.service = build("calendar", "v3", credentials=self.creds)
 
-    # ---------- Вспомогательная функция ----------
+    def _http(self) -> AuthorizedHttp:
+        """HTTP транспорт текущего потока."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=30))
+        return http
 
-    def _get_events_by_date(self, target_date: date) -> List[Event]:
-        """Возвращает события за конкретный день."""
-        start_of_day = datetime.combine(target_date, datetime.min.time(), tzinfo=self.timezone).isoformat()
-        end_of_day = datetime.combine(target_date, datetime.max.time(), tzinfo=self.timezone).isoformat()
+    def _execute(self, request):
+        return request.execute(http=self._http())
+
+    # ---------- Синхронизация ----------
 
-        events_result = self.service.events().list(
-            calendarId="primary",
-            timeMin=start_of_day,
-            timeMax=end_of_day,
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
+    def _horizon(self) -> datetime:
+        return datetime.now(self.timezone) - timedelta(days=self.history_days)
 
-        events = events_result.get("items", [])
-        result = []
+    def _list_pages(self, **params):
+        """Перебирает страницы ответа events().list."""
+        page_token = None
+        while True:
+            response = self._execute(self.service.events().list(
+                calendarId="primary",
+                singleEvents=True,
+                maxResults=self.PAGE_SIZE,
+                pageToken=page_token,
+                **params,
+            ))
+            yield response
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
 
-        for event in events:
-            start_str = event["start"].get("dateTime", event["start"].get("date"))
-            end_str = event["end"].get("dateTime", event["end"].get("date"))
+    def _sync_pages(self) -> None:
+        sync_token = self.store.sync_token
+        if sync_token is None:
+            self.store.reset()
+        horizon = self._horizon()
+        params = {"syncToken": sync_token} if sync_token else {}
+        response = {}
+        for response in self._list_pages(**params):
+            self.store.apply(response.get("items", []), not_before=horizon)
+        self.store.sync_token = response.get("nextSyncToken")
 
-            # Парсим ISO8601 в date
-            start_date = datetime.fromisoformat(start_str)
-            end_date = datetime.fromisoformat(end_str)
+    def sync(self, force: bool = False) -> None:
+        """Подтягивает изменения календаря в локальную копию."""
+        with self.store.lock:
+            if not force and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+            try:
+                self._sync_pages()
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                # токен протух — Google требует полной синхронизации
+                print("Sync token expired, running full sync")
+                self.store.reset()
+                self._sync_pages()
+            self._synced_at = time.monotonic()
 
-            result.append(Event(name=event.get("summary", "(Без названия)"),
-                                start=start_date, end=end_date))
-        return result
+    def _to_event(self, item: dict) -> Event:
+        return Event(
+            id=item["id"],
+            name=item.get("summary", "(Без названия)"),
+            start=self.store.parse(item["start"]),
+            end=self.store.parse(item["end"]),
+        )
 
     # ---------- Методы интерфейса ----------
 
+    def get_events(self, start: datetime, end: datetime) -> List[Event]:
+        """Возвращает события, пересекающиеся с интервалом [start, end)."""
+        start, end = self.store.localize(start), self.store.localize(end)
+        if start < self._horizon():
+            items = []
+            for response in self._list_pages(
+                timeMin=start.isoformat(), timeMax=end.isoformat(), orderBy="startTime"
+            ):
+                items.extend(response.get("items", []))
+        else:
+            self.sync()
+            items = self.store.between(start, end)
+        return [self._to_event(item) for item in items]
+
+    def _get_events_by_date(self, target_date: date) -> List[Event]:
+        """Возвращает события за конкретный день."""
+        start_of_day = self.store.localize(datetime.combine(target_date, datetime.min.time()))
+        return self.get_events(start_of_day, start_of_day + timedelta(days=1))
+
     def get_today_events(self) -> List[Event]:
         today = datetime.now(self.timezone).date() 
         return self._get_events_by_date(today)
@@ -82,41 +161,138 @@ class GoogleCalendarService(CalendarService):
         return self._get_events_by_date(tomorrow)
 
 
-    def add_event(self, name: str, start: datetime, end: datetime) -> None:
-        """Добавляет событие в календарь."""
-        # Конвертируем даты в datetime UTC
-        start = start - timedelta(hours=3)
-        end = end - timedelta(hours=3)
-        start_datetime = start.isoformat() + "Z"
-        end_datetime = end.isoformat() + "Z"
-        print(start_datetime, end_datetime)
-        event_body = {
+    def _event_body(self, name: str, start: datetime, end: datetime) -> dict:
+        # наивное время — московское, в API отдаем UTC
+        start = self.store.localize(start).astimezone(timezone.utc)
+        end = self.store.localize(end).astimezone(timezone.utc)
+        return {
             "summary": name,
             "start": {
-                "dateTime": start_datetime,
+                "dateTime": start.isoformat(),
                 "timeZone": "UTC"
             },
             "end": {
-                "dateTime": end_datetime,
+                "dateTime": end.isoformat(),
                 "timeZone": "UTC"
             },
         }
 
-        event = self.service.events().insert(calendarId="primary", body=event_body).execute()
-        self.events[name] = event.get("id")
+    def _run_batch(self, requests: list) -> list[dict]:
+        """
+        Выполняет запросы пачками через batch HTTP API.
+
+        Возвращает результат по каждому запросу в исходном порядке:
+        {"status": "ok", "response": ...} или {"status": "error", "error": ...}.
+        """
+        results: list[dict] = [{} for _ in requests]
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                reason = exception.reason if isinstance(exception, HttpError) else str(exception)
+                results[index] = {"status": "error", "error": reason}
+            else:
+                results[index] = {"status": "ok", "response": response}
+
+        for offset in range(0, len(requests), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index, request in enumerate(requests[offset:offset + self.BATCH_SIZE], start=offset):
+                batch.add(request, request_id=str(index))
+            batch.execute(http=self._http())
+        return results
+
+    def add_event(self, name: str, start: datetime, end: datetime) -> None:
+        """Добавляет событие в календарь."""
+        event_body = self._event_body(name, start, end)
+        event = self._execute(self.service.events().insert(calendarId="primary", body=event_body))
+        self.store.apply([event])
         return {"message": "Событие добавлено"}
 
+    def add_events(self, events: List[Event]) -> list[dict]:
+        """Добавляет несколько событий одним batch запросом."""
+        requests = [
+            self.service.events().insert(calendarId="primary", body=self._event_body(e.name, e.start, e.end))
+            for e in events
+        ]
+        results = []
+        for event, result in zip(events, self._run_batch(requests)):
+            if result["status"] == "ok":
+                self.store.apply([result["response"]])
+                results.append({"name": event.name, "status": "ok", "id": result["response"].get("id")})
+            else:
+                results.append({"name": event.name, "status": "error", "error": result["error"]})
+        return results
+
     def delete_event(self, event_id: str) -> None:
         """Удаляет событие по Названию."""
         try:
             # event_id = self.events.get(name)
             # if not event_id:
-            #     return {"message": "Событие не найдено"}
-            self.service.events().delete(calendarId="primary", eventId=event_id).execute()
+            #     return {"message": "Событие не найдено"}
+            self._execute(self.service.events().delete(calendarId="primary", eventId=event_id))
+            self.store.remove(event_id)
             return {"message": "Событие удалено"}
         except Exception as e:
             return {"message": "Произошла ошибка при удалении события"}
 
+    def delete_events(self, event_ids: List[str]) -> list[dict]:
+        """Удаляет несколько событий одним batch запросом."""
+        requests = [self.service.events().delete(calendarId="primary", eventId=event_id) for event_id in event_ids]
+        results = []
+        for event_id, result in zip(event_ids, self._run_batch(requests)):
+            if result["status"] == "ok":
+                self.store.remove(event_id)
+                results.append({"id": event_id, "status": "ok"})
+            else:
+                results.append({"id": event_id, "status": "error", "error": result["error"]})
+        return results
+
+    def find_free_slots(
+        self,
+        start: datetime,
+        end: datetime,
+        duration_minutes: int,
+        day_start_hour: int = 9,
+        day_end_hour: int = 19,
+        limit: int = 10,
+    ) -> list[dict]:
+        """
+        Ищет свободные окна не короче `duration_minutes` в рабочие часы.
+
+        Занятость берется из freebusy, события целиком не загружаются.
+        """
+        start, end = self.store.localize(start), self.store.localize(end)
+        response = self._execute(self.service.freebusy().query(body={
+            "timeMin": start.isoformat(),
+            "timeMax": end.isoformat(),
+            "timeZone": str(self.timezone),
+            "items": [{"id": "primary"}],
+        }))
+        busy = sorted(
+            (datetime.fromisoformat(b["start"]), datetime.fromisoformat(b["end"]))
+            for b in response["calendars"]["primary"].get("busy", [])
+        )
+
+        duration = timedelta(minutes=duration_minutes)
+        slots = []
+        day = start.astimezone(self.timezone).date()
+        while len(slots) < limit:
+            day_start = self.store.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=day_start_hour))
+            day_end = self.store.localize(datetime.combine(day, datetime.min.time()) + timedelta(hours=day_end_hour))
+            if day_start >= end:
+                break
+            cursor, window_end = max(day_start, start), min(day_end, end)
+            for busy_start, busy_end in busy:
+                if busy_end <= cursor or busy_start >= window_end:
+                    continue
+                if busy_start - cursor >= duration:
+                    slots.append({"start": cursor.isoformat(), "end": busy_start.isoformat()})
+                cursor = max(cursor, busy_end)
+            if window_end - cursor >= duration:
+                slots.append({"start": cursor.isoformat(), "end": window_end.isoformat()})
+            day += timedelta(days=1)
+        return slots[:limit]
+
 if __name__ == '__main__':
     calendar_service = GoogleCalendarService()
     events = calendar_service.get_today_events()
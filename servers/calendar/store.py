@@ -0,0 +1,89 @@
+import bisect
+import threading
+from datetime import datetime, timedelta, tzinfo
+
+
+class EventStore:
+    """
+    Локальная копия событий календаря с индексом по времени начала.
+
+    Наполняется полной синхронизацией, дальше получает только изменения
+    по `syncToken`. Отмененные события удаляются, остальные заменяются целиком.
+    """
+
+    def __init__(self, timezone: tzinfo):
+        self.timezone = timezone
+        self.sync_token: str | None = None
+        self._events: dict[str, dict] = {}  # id: событие из API
+        self._spans: dict[str, tuple[datetime, datetime]] = {}  # id: (начало, конец)
+        self._index: list[tuple[datetime, str]] | None = []
+        self._max_duration = timedelta(0)
+        self.lock = threading.RLock()
+
+    def localize(self, moment: datetime) -> datetime:
+        """Наивное время считается временем календаря."""
+        if moment.tzinfo is not None:
+            return moment
+        if hasattr(self.timezone, "localize"):  # pytz
+            return self.timezone.localize(moment)
+        return moment.replace(tzinfo=self.timezone)
+
+    def parse(self, value: dict) -> datetime:
+        if "dateTime" in value:
+            return self.localize(datetime.fromisoformat(value["dateTime"]))
+        # событие на весь день
+        return self.localize(datetime.fromisoformat(value["date"]))
+
+    def reset(self) -> None:
+        with self.lock:
+            self.sync_token = None
+            self._events.clear()
+            self._spans.clear()
+            self._index = []
+            self._max_duration = timedelta(0)
+
+    def apply(self, items: list[dict], not_before: datetime | None = None) -> None:
+        """
+        Применяет список событий из events().list, включая удаленные.
+
+        События, закончившиеся раньше `not_before`, не хранятся.
+        """
+        with self.lock:
+            for item in items:
+                self.remove(item["id"])
+                if item.get("status") == "cancelled" or "start" not in item:
+                    continue
+                start, end = self.parse(item["start"]), self.parse(item["end"])
+                if not_before is not None and end < not_before:
+                    continue
+                self._events[item["id"]] = item
+                self._spans[item["id"]] = (start, end)
+                self._max_duration = max(self._max_duration, end - start)
+                if self._index is not None:
+                    bisect.insort(self._index, (start, item["id"]))
+
+    def remove(self, event_id: str) -> None:
+        with self.lock:
+            if self._events.pop(event_id, None) is not None:
+                self._spans.pop(event_id)
+                # перестроим индекс при следующем чтении
+                self._index = None
+
+    def between(self, start: datetime, end: datetime) -> list[dict]:
+        """События, пересекающиеся с [start, end), в порядке начала."""
+        with self.lock:
+            if self._index is None:
+                self._index = sorted((span[0], event_id) for event_id, span in self._spans.items())
+            lo = bisect.bisect_left(self._index, (start - self._max_duration,))
+            hi = bisect.bisect_left(self._index, (end,))
+            return [
+                self._events[event_id]
+                for _, event_id in self._index[lo:hi]
+                if self._spans[event_id][1] > start
+            ]
+
+    def span(self, event_id: str) -> tuple[datetime, datetime]:
+        return self._spans[event_id]
+
+    def __len__(self) -> int:
+        return len(self._events)
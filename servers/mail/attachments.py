@@ -0,0 +1,326 @@
+import base64
+import email.policy
+import http.client
+import ipaddress
+import mimetypes
+import os
+import re
+import smtplib
+import socket
+import tempfile
+import time
+import urllib.parse
+import uuid
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import getaddresses
+from typing import BinaryIO
+
+from utils import convert_attachments
+
+
+CHUNK = 57 * 1024  # кратно 57 байтам: каждый кусок кодируется целыми строками base64 по 76 символов
+
+_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Соединение с уже проверенным адресом: повторный DNS запрос не подменит сервер."""
+
+    def __init__(self, host: str, address: str, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self) -> None:
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host: str, address: str, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self) -> None:
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+@dataclass
+class Attachment:
+    name: str
+    mime: str
+    size: int
+    file: BinaryIO
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def sniff_mime(name: str, head: bytes) -> str:
+    """MIME тип по расширению, иначе по сигнатуре первых байт."""
+    guessed, _ = mimetypes.guess_type(name)
+    if guessed:
+        return guessed
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return "application/octet-stream"
+
+
+class AttachmentResolver:
+    """
+    Превращает ссылки на вложения в открытые файлы, не загружая их в память.
+
+    Ссылка — имя файла в каталоге `staging_dir`, http(s) URL или, для совсем
+    маленьких вложений, "base64:<данные>". Размер каждого вложения и сумма
+    проверяются до начала отправки; URL скачивается потоком во временный файл
+    и обрывается, как только превышен лимит или `download_timeout`.
+
+    Ссылку выбирает агент, а он читает входящую почту, поэтому URL — недоверенный
+    ввод: скачивание разрешено только с хостов из `allowed_hosts` (и их поддоменов),
+    адрес хоста не должен быть внутренним, редиректы не выполняются.
+    """
+
+    def __init__(
+        self,
+        staging_dir: str,
+        max_bytes: int,
+        max_total_bytes: int,
+        allowed_hosts: list[str] | None = None,
+        download_timeout: float = 60,
+        inline_max_bytes: int = 8 * 1024,
+    ):
+        self.staging_dir = os.path.realpath(staging_dir)
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.allowed_hosts = [host.lower().strip(".") for host in allowed_hosts or [] if host]
+        self.download_timeout = download_timeout
+        self.inline_max_bytes = inline_max_bytes
+
+    def _check_size(self, name: str, size: int) -> None:
+        if size > self.max_bytes:
+            raise ValueError(f"Вложение {name} больше {self.max_bytes // (1024 * 1024)} МБ")
+
+    def _staged(self, ref: str) -> Attachment:
+        path = os.path.realpath(os.path.join(self.staging_dir, ref))
+        if os.path.dirname(path) != self.staging_dir or not os.path.isfile(path):
+            raise ValueError(f"Файл {ref} не найден в каталоге вложений")
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+        self._check_size(name, size)
+        file = open(path, "rb")
+        mime = sniff_mime(name, file.read(16))
+        file.seek(0)
+        return Attachment(name, mime, size, file)
+
+    def list_staged(self) -> list[dict]:
+        """Файлы каталога вложений, которые можно передать по имени."""
+        if not os.path.isdir(self.staging_dir):
+            return []
+        files = []
+        for entry in sorted(os.scandir(self.staging_dir), key=lambda entry: entry.name):
+            if entry.is_file() and not entry.name.startswith("."):
+                size = entry.stat().st_size
+                files.append({
+                    "name": entry.name,
+                    "size": size,
+                    "mime": sniff_mime(entry.name, b""),
+                    "too_large": size > self.max_bytes,
+                })
+        return files
+
+    def _host_allowed(self, host: str) -> bool:
+        host = host.lower().strip(".")
+        return any(host == allowed or host.endswith("." + allowed) for allowed in self.allowed_hosts)
+
+    @staticmethod
+    def _public_address(host: str, port: int) -> str:
+        """Адрес хоста, если все его адреса публичные; иначе ValueError."""
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise ValueError(f"Не удалось разрешить {host}: {e}")
+        addresses = [info[4][0] for info in infos]
+        for address in addresses:
+            if not ipaddress.ip_address(address.split("%")[0]).is_global:
+                raise ValueError(f"Хост {host} указывает на внутренний адрес {address}")
+        return addresses[0]
+
+    def _download(self, url: str) -> Attachment:
+        parsed = urllib.parse.urlparse(url)
+        host = parsed.hostname or ""
+        if not self._host_allowed(host):
+            raise ValueError(f"Загрузка вложений с {host or url} не разрешена")
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        deadline = time.monotonic() + self.download_timeout
+
+        connection_class = _PinnedHTTPSConnection if parsed.scheme == "https" else _PinnedHTTPConnection
+        conn = connection_class(host, self._public_address(host, port), port=port, timeout=self.download_timeout)
+        file = None
+        try:
+            path = parsed.path or "/"
+            conn.request("GET", f"{path}?{parsed.query}" if parsed.query else path)
+            response = conn.getresponse()
+            if response.status != 200:
+                # редиректы не выполняем: адрес назначения не проверен
+                raise ValueError(f"Сервер вернул {response.status} {response.reason} для {url}")
+
+            name = response.headers.get_filename() or os.path.basename(parsed.path) or "attachment"
+            length = response.headers.get("Content-Length")
+            if length is not None and length.isdigit():
+                self._check_size(name, int(length))
+
+            file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+            size = 0
+            while chunk := response.read(64 * 1024):
+                if time.monotonic() > deadline:
+                    raise ValueError(f"Вложение {name} не скачалось за {self.download_timeout:g} с")
+                size += len(chunk)
+                self._check_size(name, size)
+                file.write(chunk)
+            file.seek(0)
+            mime = response.headers.get_content_type()
+            if mime in ("application/octet-stream", "text/plain") and "Content-Type" not in response.headers:
+                mime = sniff_mime(name, file.read(16))
+                file.seek(0)
+        except Exception:
+            if file is not None:
+                file.close()
+            raise
+        finally:
+            conn.close()
+        return Attachment(name, mime, size, file)
+
+    def _inline(self, index: int, data: str) -> Attachment:
+        # проверяем до декодирования: большие данные в аргументах инструмента не нужны
+        if len(data) * 3 // 4 > self.inline_max_bytes:
+            raise ValueError(
+                f"Вложение {index} в base64 больше {self.inline_max_bytes // 1024} КБ: "
+                "положите файл в каталог вложений или передайте ссылкой"
+            )
+        file = convert_attachments([data])[0]
+        file.name = f"attachment_{index}.bin"
+        size = file.getbuffer().nbytes
+        self._check_size(file.name, size)
+        return Attachment(file.name, sniff_mime("", file.read(16)), size, file)
+
+    def resolve(self, refs: list[str]) -> list[Attachment]:
+        attachments = []
+        try:
+            for index, ref in enumerate(refs, start=1):
+                scheme = urllib.parse.urlparse(ref).scheme
+                if scheme in ("http", "https"):
+                    attachment = self._download(ref)
+                elif ref.startswith("base64:"):
+                    attachment = self._inline(index, ref.removeprefix("base64:"))
+                else:
+                    attachment = self._staged(ref)
+                attachments.append(attachment)
+                if sum(a.size for a in attachments) > self.max_total_bytes:
+                    raise ValueError(f"Вложения вместе больше {self.max_total_bytes // (1024 * 1024)} МБ")
+        except Exception:
+            for attachment in attachments:
+                attachment.close()
+            raise
+        return attachments
+
+
+def _headers(headers: dict[str, str]) -> bytes:
+    """
+    Заголовки с пустой строкой в конце; не-ASCII кодируется по RFC 2047/2231.
+
+    Значения приходят от агента, поэтому перевод строки в них — попытка дописать
+    свой заголовок, как и в EmailMessage, это ошибка.
+    """
+    for key, value in headers.items():
+        if "\r" in value or "\n" in value:
+            raise ValueError(f"Заголовок {key} не может содержать перевод строки")
+    policy = email.policy.SMTP
+    folded = b"".join(policy.fold_binary(k, policy.header_factory(k, v)) for k, v in headers.items())
+    return folded + b"\r\n"
+
+
+def _dot_stuff(data: bytes) -> bytes:
+    data = data.replace(b"\r\n.", b"\r\n..")
+    return b"." + data if data.startswith(b".") else data
+
+
+def send_streaming(
+    smtp: smtplib.SMTP,
+    sender: str,
+    to: str,
+    subject: str,
+    body: str,
+    attachments: list[Attachment],
+) -> dict:
+    """
+    Отправляет письмо с вложениями, кодируя файлы в base64 прямо в поток DATA.
+
+    Сообщение целиком в памяти не собирается: заголовки и текст формирует
+    EmailMessage, а каждый файл читается кусками и сразу уходит в сокет.
+
+    Как и `smtplib.SMTP.sendmail`, возвращает адресатов, которых сервер отклонил,
+    если остальным письмо доставлено; исключение — только если не принят никто.
+    """
+    recipients = [address for _, address in getaddresses([to]) if address]
+    if not recipients:
+        raise ValueError(f"Нет адреса получателя в {to!r}")
+
+    boundary = f"=={uuid.uuid4().hex}"
+    text = EmailMessage(policy=email.policy.SMTP)
+    text.set_content(body)
+    del text["MIME-Version"]
+    head = _headers({
+        "From": sender,
+        "To": to,
+        "Subject": subject,
+        "MIME-Version": "1.0",
+        "Content-Type": f'multipart/mixed; boundary="{boundary}"',
+    })
+
+    smtp.ehlo_or_helo_if_needed()
+    code, reply = smtp.mail(sender)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, reply, sender)
+    refused = {}
+    for rcpt in recipients:
+        code, reply = smtp.rcpt(rcpt)
+        if code not in (250, 251):
+            refused[rcpt] = (code, reply)
+    if len(refused) == len(recipients):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    smtp.putcmd("data")
+    code, reply = smtp.getreply()
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, reply)
+
+    delimiter = f"\r\n--{boundary}\r\n".encode()
+    smtp.send(_dot_stuff(head) + delimiter + _dot_stuff(text.as_bytes()))
+    for attachment in attachments:
+        filename = re.sub(r'[\x00-\x1f\x7f\\"]', "", attachment.name)
+        smtp.send(delimiter + _headers({
+            "Content-Type": attachment.mime,
+            "Content-Transfer-Encoding": "base64",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }))
+        attachment.file.seek(0)
+        while chunk := attachment.file.read(CHUNK):
+            # в алфавите base64 нет точки, экранировать строки не нужно
+            smtp.send(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+    smtp.send(f"\r\n--{boundary}--\r\n.\r\n".encode())
+
+    code, reply = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, reply)
+    return refused
+
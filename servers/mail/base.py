@@ -1,12 +1,23 @@
 from abc import ABC, abstractmethod
-import io
+
+from pydantic import BaseModel, Field
+
+
+class OutgoingEmail(BaseModel):
+    to: str = Field(description="Адрес получателя")
+    subject: str = Field(description="Тема письма")
+    body: str = Field(description="Текст письма")
+
 
 class MailService(ABC):
     @abstractmethod
     def send_email(self, to: str, subject: str, body: str): ...
 
     @abstractmethod
-    def send_email_with_attachments(self, to: str, subject: str, body: str, attachments: list[io.BytesIO]): ...
+    def send_emails(self, messages: list[OutgoingEmail]): ...
+
+    @abstractmethod
+    def send_email_with_attachments(self, to: str, subject: str, body: str, attachments: list[str]): ...
 
     @abstractmethod
     def recieve_emails(self): ...
\ No newline at end of file
@@ -0,0 +1,312 @@
+import base64
+import email
+import email.policy
+import imaplib
+import quopri
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+# атом, у которого может быть секция [..] со скобками и пробелами внутри и смещение <n>
+_TOKEN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"\[]+(?:\[[^\]]*\])?(?:<[\d.]+>)?')
+_LITERAL = re.compile(rb"\{\d+\}$")
+
+HEADER_FIELDS = "FROM TO CC SUBJECT DATE MESSAGE-ID"
+
+_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+class Literal(bytes):
+    """Строковый литерал {n} из ответа сервера."""
+
+
+def _tokenize(data: list):
+    """Токены ответа imaplib: bytes — текст, tuple — текст и литерал."""
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item
+            for token in _TOKEN.findall(_LITERAL.sub(b"", head)):
+                yield token
+            yield Literal(literal)
+        elif isinstance(item, bytes):
+            yield from _TOKEN.findall(item)
+
+
+def _parse(tokens) -> list:
+    result = []
+    stack = [result]
+    for token in tokens:
+        if isinstance(token, Literal):
+            stack[-1].append(bytes(token))
+        elif token == b"(":
+            stack[-1].append([])
+            stack.append(stack[-1][-1])
+        elif token == b")":
+            stack.pop()
+        elif token.startswith(b'"'):
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", token[1:-1]))
+        elif token.upper() == b"NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token)
+    return result
+
+
+def parse_fetch(data: list) -> dict[int, dict[str, object]]:
+    """
+    Разбирает ответ UID FETCH в {uid: {элемент: значение}}.
+
+    Ключи элементов — в верхнем регистре и без смещения: BODY[1]<0> -> BODY[1].
+    """
+    messages = {}
+    parsed = _parse(_tokenize(data))
+    for i in range(0, len(parsed) - 1, 2):
+        items = parsed[i + 1]
+        if not isinstance(items, list):
+            continue
+        fields = {}
+        for key, value in zip(items[::2], items[1::2]):
+            fields[re.sub(r"<[\d.]+>$", "", key.decode().upper())] = value
+        if "UID" in fields:
+            messages[int(fields["UID"])] = fields
+    return messages
+
+
+def _text(value) -> str:
+    return value.decode(errors="ignore") if isinstance(value, bytes) else ""
+
+
+def _params(value) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_text(k).lower(): _text(v) for k, v in zip(value[::2], value[1::2])}
+
+
+def find_text_part(structure, prefix: str = "") -> tuple[str, str, str] | None:
+    """
+    Ищет в BODYSTRUCTURE первую text/plain часть, которая не вложение.
+
+    Возвращает (номер части, Content-Transfer-Encoding, кодировку).
+    """
+    if not isinstance(structure, list) or not structure:
+        return None
+    if isinstance(structure[0], list):  # multipart: дочерние части, потом подтип и расширения
+        for index, child in enumerate(structure, start=1):
+            if not isinstance(child, list):
+                break
+            found = find_text_part(child, f"{prefix}{index}.")
+            if found:
+                return found
+        return None
+
+    if _text(structure[0]).lower() != "text" or _text(structure[1]).lower() != "plain":
+        return None
+    # у text/* после размера идет число строк, потом md5 и disposition
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and _text(disposition[0]).lower() == "attachment":
+        return None
+    charset = _params(structure[2]).get("charset", "utf-8")
+    return (prefix.rstrip(".") or "1", _text(structure[5]).lower(), charset)
+
+
+def decode_part(payload: bytes, encoding: str, charset: str) -> str:
+    """Декодирует (возможно обрезанное частичным FETCH) тело части."""
+    if encoding == "base64":
+        payload = re.sub(rb"\s+", b"", payload)
+        payload = base64.b64decode(payload[: len(payload) // 4 * 4])
+    elif encoding == "quoted-printable":
+        payload = quopri.decodestring(payload)
+    try:
+        return payload.decode(charset, errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
+
+
+def parse_headers(raw: bytes) -> dict[str, str]:
+    msg = email.message_from_bytes(raw, policy=email.policy.default)
+    return {
+        "from": str(msg.get("From", "")),
+        "to": str(msg.get("To", "")),
+        "subject": str(msg.get("Subject", "")),
+        "date": str(msg.get("Date", "")),
+    }
+
+
+def imap_date(value: date) -> str:
+    return f"{value.day:02d}-{_MONTHS[value.month - 1]}-{value.year}"
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_search(
+    gmail: bool,
+    sender: str | None = None,
+    recipient: str | None = None,
+    subject: str | None = None,
+    since: date | None = None,
+    before: date | None = None,
+    unseen: bool = False,
+    has_attachment: bool = False,
+    text: str | None = None,
+) -> tuple[list[str], bytes | None]:
+    """
+    Переводит фильтры в аргументы UID SEARCH.
+
+    Возвращает аргументы команды и литерал, который imaplib допишет в конец.
+    Для Gmail весь запрос уходит одним литералом X-GM-RAW в синтаксисе поиска Gmail:
+    так работают кириллица и has:attachment. Для прочих серверов — обычные
+    критерии IMAP, не-ASCII значение допускается только одно (оно идет литералом).
+    """
+    if gmail:
+        terms = []
+        for key, value in (("from", sender), ("to", recipient), ("subject", subject)):
+            if value:
+                # поиск Gmail не понимает экранирования кавычек внутри фразы
+                terms.append(f'{key}:"{value.replace(chr(34), "")}"')
+        if since:
+            terms.append(f"after:{since:%Y/%m/%d}")
+        if before:
+            terms.append(f"before:{before:%Y/%m/%d}")
+        if unseen:
+            terms.append("is:unread")
+        if has_attachment:
+            terms.append("has:attachment")
+        if text:
+            terms.append(text)
+        if not terms:
+            return ["ALL"], None
+        return ["CHARSET", "UTF-8", "X-GM-RAW"], " ".join(terms).encode()
+
+    criteria = []
+    literal = None
+    for key, value in (("FROM", sender), ("TO", recipient), ("SUBJECT", subject), ("TEXT", text)):
+        if not value:
+            continue
+        if value.isascii():
+            criteria += [key, _quote(value)]
+        elif literal is None:
+            literal = (key, value.encode())
+        else:
+            raise ValueError("Сервер без X-GM-RAW: в поиске допустимо только одно значение не латиницей")
+    if since:
+        criteria += ["SINCE", imap_date(since)]
+    if before:
+        criteria += ["BEFORE", imap_date(before)]
+    if unseen:
+        criteria.append("UNSEEN")
+    if has_attachment:
+        # в стандартном IMAP признака вложения нет, ищем по типу содержимого
+        criteria += ["HEADER", "Content-Type", "multipart/mixed"]
+    if literal is not None:
+        return ["CHARSET", "UTF-8", *criteria, literal[0]], literal[1]
+    return criteria or ["ALL"], None
+
+
+def quote_mailbox(mailbox: str) -> str:
+    if mailbox.startswith('"'):
+        return mailbox
+    return '"' + mailbox.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class HeaderCache:
+    """LRU сводок писем: (ящик, UIDVALIDITY, UID) -> заголовки и начало текста."""
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is not None:
+            self._data.move_to_end(key)
+        return item
+
+    def set(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def drop_mailbox(self, mailbox: str) -> None:
+        for key in [k for k in self._data if k[0] == mailbox]:
+            del self._data[key]
+
+
+class IMAPSession:
+    """
+    Долгоживущее IMAP соединение.
+
+    imaplib не потокобезопасен, поэтому команды идут под локом. Перед командой
+    после долгого простоя соединение проверяется NOOP; если сервер его закрыл,
+    команда повторяется по новому соединению.
+    """
+
+    def __init__(self, host: str, user: str, password: str, keepalive_after: float = 300):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.keepalive_after = keepalive_after
+        self.lock = threading.RLock()
+        self._conn: imaplib.IMAP4_SSL | None = None
+        self._used_at = 0.0
+
+    def _connect(self) -> imaplib.IMAP4_SSL:
+        conn = imaplib.IMAP4_SSL(self.host, timeout=30)
+        conn.login(self.user, self.password)
+        return conn
+
+    def _drop(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.logout()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _ensure(self) -> imaplib.IMAP4_SSL:
+        if self._conn is not None and time.monotonic() - self._used_at > self.keepalive_after:
+            try:
+                self._conn.noop()
+            except (imaplib.IMAP4.abort, OSError):
+                self._drop()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    @staticmethod
+    def select(conn: imaplib.IMAP4_SSL, mailbox: str) -> tuple[int, int, int]:
+        """
+        Выбирает ящик только для чтения.
+
+        Возвращает (число писем, UIDVALIDITY, UIDNEXT) из ответа SELECT:
+        по ним видно, появились ли новые письма и действительны ли закешированные UID.
+        """
+        status, data = conn.select(quote_mailbox(mailbox), readonly=True)
+        if status != "OK":
+            raise imaplib.IMAP4.error(_text(data[0]) if data else f"Cannot select {mailbox}")
+        _, validity = conn.response("UIDVALIDITY")
+        _, uidnext = conn.response("UIDNEXT")
+        return int(data[0]), int(validity[-1] or 0), int(uidnext[-1] or 0)
+
+    def run(self, func):
+        """Выполняет `func(conn)` под локом, переподключаясь один раз при обрыве."""
+        with self.lock:
+            for attempt in range(2):
+                conn = self._ensure()
+                try:
+                    result = func(conn)
+                    self._used_at = time.monotonic()
+                    return result
+                except (imaplib.IMAP4.abort, OSError):
+                    self._drop()
+                    if attempt:
+                        raise
+
+    def close(self) -> None:
+        with self.lock:
+            self._drop()
@@ -1,19 +1,29 @@
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
+import asyncio
 import base64
+from datetime import date
 import os
 import io
 
-from service import GmailService
-from utils import convert_attachments, load_config
+from base import OutgoingEmail
+from service import GmailService, describe_error, describe_refused
+from utils import load_config
 
 mcp = FastMCP("mail")
 
 config = load_config()
-service = GmailService(config.EMAIL_ADDRESS, config.APP_PASSWORD)
+service = GmailService(
+    config.EMAIL_ADDRESS,
+    config.APP_PASSWORD,
+    smtp_pool_size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+    attachments_dir=os.getenv("ATTACHMENTS_DIR", "attachments"),
+    attachment_max_bytes=int(os.getenv("ATTACHMENT_MAX_MB", "18")) * 1024 * 1024,
+    attachment_url_hosts=os.getenv("ATTACHMENT_URL_HOSTS", "").split(","),
+)
 
 @mcp.tool()
-def send_email(to: str, subject: str, body: str):
+async def send_email(to: str, subject: str, body: str):
     """
     Отправляет письмо на указанный адрес с указанным предметом и текстом.
 
@@ -21,31 +31,64 @@ def send_email(to: str, subject: str, body: str):
     :param subject: Предмет письма.
     :param body: Текст письма.
     """
-    status = service.send_email(to, subject, body)
-    if status:
-        return {"message": f"Email sent to {subject}"}
-    return {"message": f"Failed to send email to {subject}"}
+    try:
+        refused = await asyncio.to_thread(service.send_email, to, subject, body)
+    except Exception as e:
+        return {"message": f"Failed to send email to {to}: {describe_error(e)}"}
+    if refused:
+        return {"message": f"Email sent, but not delivered to: {describe_refused(refused)}"}
+    return {"message": f"Email sent to {to}"}
 
 
 @mcp.tool()
-def send_email_with_attachments(to: str, subject: str, body: str, attachments: list[str]):
+async def send_emails(messages: list[OutgoingEmail]):
+    """
+    Отправляет несколько писем за один вызов. Используй вместо send_email в цикле.
+
+    :param messages: Письма: адрес получателя, предмет и текст каждого.
+    :return: Статус по каждому письму (sent; partial — доставлено не всем адресатам; error) и причина.
+    """
+    results = await asyncio.to_thread(service.send_emails, messages)
+    return {"results": results}
+
+
+@mcp.tool()
+async def send_email_with_attachments(to: str, subject: str, body: str, attachments: list[str]):
     """
     Отправляет письмо с вложениями на указанный адрес с указанным предметом и текстом.
 
     :param to: Адрес получателя.
     :param subject: Предмет письма.
     :param body: Текст письма.
-    :param attachments: Список вложений в формате base64.
+    :param attachments: Ссылки на вложения, каждая в одной из форм:
+        - имя файла в каталоге вложений (список — list_attachments);
+        - http(s) URL с разрешенного хоста;
+        - "base64:<данные>" — только для совсем маленьких файлов, до 8 КБ.
+        Большие файлы содержимым не передавай.
     """
-    files = convert_attachments(attachments)
-    status = service.send_email_with_attachments(to, subject, body, files)
-    if status:
-        return {"message": f"Email sent to {subject}"}
-    return {"message": f"Failed to send email to {subject}"}
+    try:
+        refused = await asyncio.to_thread(service.send_email_with_attachments, to, subject, body, attachments)
+    except Exception as e:
+        return {"message": f"Failed to send email to {to}: {describe_error(e)}"}
+    if refused:
+        return {"message": f"Email sent, but not delivered to: {describe_refused(refused)}"}
+    return {"message": f"Email sent to {to}"}
 
 
 @mcp.tool()
-def recieve_emails(mailbox: str = "INBOX", limit: int = 5):
+async def list_attachments():
+    """
+    Возвращает файлы каталога вложений, которые можно приложить к письму по имени.
+
+    :return: Имя, размер в байтах и MIME тип каждого файла; too_large — файл больше
+        предела одного письма и отправлен не будет.
+    """
+    files = await asyncio.to_thread(service.list_attachments)
+    return {"files": files}
+
+
+@mcp.tool()
+async def recieve_emails(mailbox: str = "INBOX", limit: int = 5):
     """
     Возвращает последние письма (по умолчанию 5) из указанного ящика.
 
@@ -53,10 +96,59 @@ def recieve_emails(mailbox: str = "INBOX", limit: int = 5):
     :param limit: Количество писем (по умолчанию 5).
     :return: Список словарей с информацией о письмах.
     """
-    emails = service.recieve_emails(mailbox, limit)
+    emails = await asyncio.to_thread(service.recieve_emails, mailbox, limit)
     return {"emails": emails}
 
 
+@mcp.tool()
+async def search_emails(
+    mailbox: str = "INBOX",
+    sender: str | None = None,
+    recipient: str | None = None,
+    subject: str | None = None,
+    since: date | None = None,
+    before: date | None = None,
+    unseen: bool = False,
+    has_attachment: bool = False,
+    text: str | None = None,
+    limit: int = 10,
+    cursor: int = 0,
+):
+    """
+    Ищет письма по фильтрам на стороне почтового сервера, новые сначала.
+    Используй вместо recieve_emails, когда нужно найти конкретное письмо.
+
+    :param mailbox: Имя ящика (по умолчанию "INBOX").
+    :param sender: Отправитель: адрес или часть имени.
+    :param recipient: Получатель.
+    :param subject: Слова из темы.
+    :param since: Письма начиная с этой даты (YYYY-MM-DD).
+    :param before: Письма до этой даты, не включая ее.
+    :param unseen: Только непрочитанные.
+    :param has_attachment: Только с вложениями.
+    :param text: Слова из текста письма.
+    :param limit: Писем на странице.
+    :param cursor: Значение next_cursor из предыдущего ответа.
+    :return: Письма с началом текста, общее число найденных и next_cursor.
+    """
+    return await asyncio.to_thread(
+        service.search_emails,
+        mailbox, sender, recipient, subject, since, before, unseen, has_attachment, text, limit, cursor,
+    )
+
+
+@mcp.tool()
+async def get_email(uid: int, mailbox: str = "INBOX"):
+    """
+    Возвращает письмо целиком по UID из результатов search_emails или recieve_emails.
+
+    :param uid: UID письма.
+    :param mailbox: Имя ящика, в котором искали письмо.
+    :return: Заголовки и полный текст письма.
+    """
+    return await asyncio.to_thread(service.get_email, uid, mailbox)
+
+
 
 if __name__ == "__main__":
     import logging
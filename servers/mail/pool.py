@@ -0,0 +1,135 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class SMTPPool:
+    """
+    Пул авторизованных SMTP соединений.
+
+    Соединение переиспользуется между письмами, поэтому TCP, STARTTLS и LOGIN
+    оплачиваются один раз. Перед выдачей соединение, простоявшее дольше
+    `keepalive_after` секунд (или любое, если `verify`), проверяется командой NOOP;
+    простоявшее дольше `idle_timeout` — закрывается, Gmail все равно рвет такие соединения.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        size: int = 4,
+        idle_timeout: float = 120,
+        keepalive_after: float = 15,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.keepalive_after = keepalive_after
+        self._idle: deque[tuple[float, smtplib.SMTP]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        threading.Thread(target=self._evict_loop, name="smtp-evict", daemon=True).start()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        try:
+            smtp.starttls()
+            smtp.login(self.user, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        return smtp
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @staticmethod
+    def _alive(smtp: smtplib.SMTP) -> bool:
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _take(self, verify: bool = False) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                released_at, smtp = self._idle.pop()
+            idle = time.monotonic() - released_at
+            fresh = idle < self.keepalive_after and not verify
+            if fresh or (idle < self.idle_timeout and self._alive(smtp)):
+                return smtp
+            self._close(smtp)
+        return self._connect()
+
+    def _evict_loop(self) -> None:
+        while True:
+            time.sleep(self.idle_timeout / 2)
+            self.evict_idle()
+
+    def evict_idle(self) -> None:
+        """Закрывает соединения, простоявшие дольше `idle_timeout`."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            # слева — самые давно освобожденные
+            while self._idle and now - self._idle[0][0] >= self.idle_timeout:
+                expired.append(self._idle.popleft()[1])
+        for smtp in expired:
+            self._close(smtp)
+
+    @contextmanager
+    def connection(self, verify: bool = False):
+        """Выдает соединение; если внутри блока оно упало, в пул не возвращается."""
+        with self._slots:
+            smtp = self._take(verify)
+            try:
+                yield smtp
+            except Exception as e:
+                # SMTPException наследует OSError: отказ по конкретному письму соединение не ломает
+                if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                    self._close(smtp)
+                else:
+                    self._release(smtp)
+                raise
+            else:
+                self._release(smtp)
+
+    def _release(self, smtp: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((time.monotonic(), smtp))
+
+    def run(self, func):
+        """
+        Выполняет `func(smtp)` на соединении из пула.
+
+        Соединение проверяется NOOP прямо перед вызовом и, если сервер успел его
+        закрыть, заменяется новым — до MAIL FROM ничего не отправлено, так что это
+        безопасно. Обрыв внутри `func` не повторяется: сервер мог уже принять DATA,
+        и повтор отправил бы письмо второй раз.
+        """
+        with self.connection(verify=True) as smtp:
+            return func(smtp)
+
+    def send(self, msg) -> dict:
+        """Отправляет письмо через пул, возвращает адресатов, которых сервер отклонил."""
+        return self.run(lambda smtp: smtp.send_message(msg))
+
+    def close(self) -> None:
+        with self._lock:
+            connections = [smtp for _, smtp in self._idle]
+            self._idle.clear()
+        for smtp in connections:
+            self._close(smtp)
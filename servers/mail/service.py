@@ -1,139 +1,299 @@
-import io
-import smtplib
 import imaplib
-import email
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from email.message import EmailMessage
-from email.header import decode_header
 from typing import List
 
-from base import MailService
+from attachments import AttachmentResolver, send_streaming
+from base import MailService, OutgoingEmail
+from imap import (
+    HEADER_FIELDS,
+    HeaderCache,
+    IMAPSession,
+    build_search,
+    decode_part,
+    find_text_part,
+    parse_fetch,
+    parse_headers,
+)
+from pool import SMTPPool
+
+
+def describe_refused(refused: dict) -> str:
+    """Отклоненные адресаты с ответом сервера."""
+    return "; ".join(f"{rcpt}: {code} {reply.decode(errors='ignore')}" for rcpt, (code, reply) in refused.items())
+
+
+def describe_error(e: Exception) -> str:
+    """Текст ошибки отправки, понятный агенту."""
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return describe_refused(e.recipients)
+    if isinstance(e, smtplib.SMTPResponseException):
+        return f"{e.smtp_code} {e.smtp_error.decode(errors='ignore') if isinstance(e.smtp_error, bytes) else e.smtp_error}"
+    return f"{type(e).__name__}: {e}"
 
 class GmailService(MailService):
     """
     Сервис для работы с Gmail через SMTP (отправка) и IMAP (чтение).
     """
 
-    def __init__(self, email_address: str, app_password: str):
+    def __init__(
+        self,
+        email_address: str,
+        app_password: str,
+        smtp_pool_size: int = 4,
+        body_limit: int = 2000,
+        attachments_dir: str = "attachments",
+        attachment_max_bytes: int = 18 * 1024 * 1024,
+        attachment_url_hosts: List[str] | None = None,
+    ):
         """
         :param email_address: Адрес Gmail (например, example@gmail.com)
         :param app_password: Пароль приложения (генерируется в аккаунте Google)
+        :param smtp_pool_size: Сколько SMTP соединений держать открытыми
+        :param body_limit: Сколько байт текста письма загружать для сводки
+        :param attachments_dir: Каталог, из которого берутся вложения по имени файла
+        :param attachment_max_bytes: Предел размера вложений одного письма; Gmail
+            принимает до 25 МБ, base64 раздувает файлы на треть
+        :param attachment_url_hosts: Хосты, с которых можно скачивать вложения по ссылке;
+            пустой список — только файлы из каталога вложений
         """
         self.email_address = email_address
         self.app_password = app_password
         self.smtp_server = "smtp.gmail.com"
         self.imap_server = "imap.gmail.com"
         self.smtp_port = 587
+        self.smtp = SMTPPool(self.smtp_server, self.smtp_port, email_address, app_password, size=smtp_pool_size)
+        self.imap = IMAPSession(self.imap_server, email_address, app_password)
+        self.body_limit = body_limit
+        self.attachments = AttachmentResolver(
+            attachments_dir,
+            attachment_max_bytes,
+            attachment_max_bytes,
+            allowed_hosts=attachment_url_hosts,
+        )
+        self.headers = HeaderCache()
+        self._latest: dict[str, tuple[int, int, int, list[int]]] = {}  # ящик: (UIDVALIDITY, UIDNEXT, писем, UID новых)
 
-    # ---------- Отправка обычного письма ----------
-
-    def send_email(self, to: str, subject: str, body: str):
+    def _message(self, to: str, subject: str, body: str) -> EmailMessage:
         msg = EmailMessage()
         msg["From"] = self.email_address
         msg["To"] = to
         msg["Subject"] = subject
         msg.set_content(body)
+        return msg
 
-        try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as smtp:
-                smtp.starttls()
-                smtp.login(self.email_address, self.app_password)
-                smtp.send_message(msg)
-            return True
-        
-        except Exception as e:
-            return False
-        
+    # ---------- Отправка обычного письма ----------
+
+    def send_email(self, to: str, subject: str, body: str) -> dict:
+        """
+        Отправляет письмо; при ошибке бросает исключение SMTP.
+
+        Письмо, принятое не для всех адресатов, уже отправлено: непринятые
+        возвращаются, а не бросаются, чтобы отправку не повторили.
+        """
+        return self.smtp.send(self._message(to, subject, body))
+
+    def send_emails(self, messages: List[OutgoingEmail]) -> list[dict]:
+        """Отправляет письма параллельно по соединениям пула, статус по каждому."""
+
+        def send_one(item: OutgoingEmail) -> dict:
+            try:
+                refused = self.send_email(item.to, item.subject, item.body)
+                if refused:
+                    return {"to": item.to, "status": "partial", "error": describe_refused(refused)}
+                return {"to": item.to, "status": "sent"}
+            except Exception as e:
+                return {"to": item.to, "status": "error", "error": describe_error(e)}
+
+        with ThreadPoolExecutor(max_workers=self.smtp.size) as executor:
+            return list(executor.map(send_one, messages))
 
     # ---------- Отправка письма с вложениями ----------
 
-    def send_email_with_attachments(self, to: str, subject: str, body: str, attachments: List[io.BytesIO]):
-        msg = EmailMessage()
-        msg["From"] = self.email_address
-        msg["To"] = to
-        msg["Subject"] = subject
-        msg.set_content(body)
+    def send_email_with_attachments(self, to: str, subject: str, body: str, attachments: List[str]) -> dict:
+        """
+        Отправляет письмо с вложениями по ссылкам (см. AttachmentResolver).
 
-        for i, file in enumerate(attachments, start=1):
-            # если BytesIO не имеет имени — создаем имя по умолчанию
-            filename = getattr(file, "name", f"attachment_{i}.bin")
-            file.seek(0)
-            msg.add_attachment(
-                file.read(),
-                maintype="application",
-                subtype="octet-stream",
-                filename=filename
-            )
+        Все вложения открываются и проверяются до начала отправки,
+        затем кодируются прямо в поток SMTP. Возвращает отклоненных адресатов,
+        как send_email.
+        """
+        files = self.attachments.resolve(attachments)
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as smtp:
-                smtp.starttls()
-                smtp.login(self.email_address, self.app_password)
-                smtp.send_message(msg)
-              
-            return True
-        except Exception as e:
-            return False
+            return self.smtp.run(lambda smtp: send_streaming(smtp, self.email_address, to, subject, body, files))
+        finally:
+            for file in files:
+                file.close()
+
+    def list_attachments(self) -> list[dict]:
+        """Файлы, которые можно приложить к письму по имени."""
+        return self.attachments.list_staged()
 
     # ---------- Получение писем ----------
 
+    def _summaries(self, conn, mailbox: str, validity: int, uids: List[int]) -> dict[int, dict]:
+        """
+        Сводки писем по UID: заголовки и начало первой text/plain части.
+
+        Уже загруженные берутся из кеша. Для остальных один FETCH на весь набор UID
+        забирает заголовки и BODYSTRUCTURE, затем частичный BODY.PEEK[часть]<0.n>
+        на каждый встретившийся номер текстовой части — обычно один-два запроса.
+        """
+        result = {}
+        missing = []
+        for uid in uids:
+            cached = self.headers.get((mailbox, validity, uid))
+            if cached is None:
+                missing.append(uid)
+            else:
+                result[uid] = cached
+        if not missing:
+            return result
+
+        _, data = conn.uid("FETCH", ",".join(map(str, missing)), f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])")
+        parts: dict[str, list[tuple[int, str, str]]] = {}
+        for uid, fields in parse_fetch(data).items():
+            header = next((v for k, v in fields.items() if k.startswith("BODY[HEADER")), None)
+            result[uid] = {"uid": uid, **parse_headers(header or b""), "body": ""}
+            text_part = find_text_part(fields.get("BODYSTRUCTURE"))
+            if text_part:
+                part, encoding, charset = text_part
+                parts.setdefault(part, []).append((uid, encoding, charset))
+
+        for part, items in parts.items():
+            _, data = conn.uid("FETCH", ",".join(str(uid) for uid, _, _ in items), f"(UID BODY.PEEK[{part}]<0.{self.body_limit}>)")
+            fetched = parse_fetch(data)
+            for uid, encoding, charset in items:
+                payload = fetched.get(uid, {}).get(f"BODY[{part}]") or b""
+                result[uid]["body"] = decode_part(payload, encoding, charset).strip()
+
+        for uid in missing:
+            if uid in result:
+                self.headers.set((mailbox, validity, uid), result[uid])
+        return result
+
     def recieve_emails(self, mailbox: str = "INBOX", limit: int = 5):
         """
         Возвращает последние письма (по умолчанию 5).
+
+        Если с прошлого вызова UIDNEXT и число писем не изменились,
+        ответ собирается из кеша без FETCH.
         """
-        mail = imaplib.IMAP4_SSL(self.imap_server)
-        mail.login(self.email_address, self.app_password)
-        mail.select(mailbox)
-
-        _, data = mail.search(None, "ALL")
-        mail_ids = data[0].split()
-        latest_ids = mail_ids[-limit:]
-
-        messages = []
-        for num in reversed(latest_ids):
-            _, msg_data = mail.fetch(num, "(RFC822)")
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            subject, encoding = decode_header(msg["Subject"])[0]
-            if isinstance(subject, bytes):
-                subject = subject.decode(encoding or "utf-8")
-
-            from_ = msg.get("From")
-            body = ""
-
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain" and part.get("Content-Disposition") is None:
-                        body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                        break
+
+        def fetch(conn):
+            exists, validity, uidnext = IMAPSession.select(conn, mailbox)
+            latest = self._latest.get(mailbox)
+            if latest and latest[0] != validity:
+                # UID в ящике перенумерованы — кеш недействителен
+                self.headers.drop_mailbox(mailbox)
+            if not exists:
+                return []
+
+            if latest and latest[:3] == (validity, uidnext, exists) and len(latest[3]) >= limit:
+                uids = latest[3][:limit]
             else:
-                body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
+                _, data = conn.fetch(f"{max(1, exists - limit + 1)}:{exists}", "(UID)")
+                uids = sorted(parse_fetch(data), reverse=True)
+                self._latest[mailbox] = (validity, uidnext, exists, uids)
 
-            messages.append({
-                "from": from_,
-                "subject": subject,
-                "body": body.strip()
-            })
+            summaries = self._summaries(conn, mailbox, validity, uids)
+            return [summaries[uid] for uid in uids if uid in summaries]
 
-        mail.logout()
+        messages = self.imap.run(fetch)
         print(f"📬 Получено {len(messages)} писем")
         return messages
 
 
+    # ---------- Поиск писем ----------
+
+    def search_emails(
+        self,
+        mailbox: str = "INBOX",
+        sender: str | None = None,
+        recipient: str | None = None,
+        subject: str | None = None,
+        since: date | None = None,
+        before: date | None = None,
+        unseen: bool = False,
+        has_attachment: bool = False,
+        text: str | None = None,
+        limit: int = 10,
+        cursor: int = 0,
+        snippet_chars: int = 300,
+    ) -> dict:
+        """
+        Ищет письма на стороне сервера и возвращает страницу сводок, новые сначала.
+
+        Поиск отдает только UID, сводки страницы берутся из кеша или догружаются
+        пачкой, как в recieve_emails. Текст письма обрезается до `snippet_chars`.
+        """
+
+        def search(conn):
+            _, validity, _ = IMAPSession.select(conn, mailbox)
+            args, literal = build_search(
+                "X-GM-EXT-1" in conn.capabilities,
+                sender, recipient, subject, since, before, unseen, has_attachment, text,
+            )
+            conn.literal = literal
+            status, data = conn.uid("SEARCH", *args)
+            if status != "OK":
+                raise imaplib.IMAP4.error(data[0].decode(errors="ignore") if data and data[0] else "SEARCH failed")
+            uids = sorted((int(uid) for uid in (data[0] or b"").split()), reverse=True)
+            page = uids[cursor:cursor + limit]
+            summaries = self._summaries(conn, mailbox, validity, page)
+            return uids, [summaries[uid] for uid in page if uid in summaries]
+
+        uids, page = self.imap.run(search)
+        emails = []
+        for summary in page:
+            body = summary["body"]
+            emails.append({**summary, "body": body[:snippet_chars] + ("…" if len(body) > snippet_chars else "")})
+        next_cursor = cursor + limit if cursor + limit < len(uids) else None
+        return {"emails": emails, "total": len(uids), "next_cursor": next_cursor}
+
+    def get_email(self, uid: int, mailbox: str = "INBOX", max_chars: int = 20000) -> dict:
+        """Возвращает заголовки и полный текст письма по UID."""
+
+        def fetch(conn):
+            IMAPSession.select(conn, mailbox)
+            _, data = conn.uid("FETCH", str(uid), f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])")
+            fields = parse_fetch(data).get(uid)
+            if fields is None:
+                raise ValueError(f"Письмо с UID {uid} не найдено в {mailbox}")
+            header = next((v for k, v in fields.items() if k.startswith("BODY[HEADER")), None)
+            result = {"uid": uid, **parse_headers(header or b""), "body": ""}
+            text_part = find_text_part(fields.get("BODYSTRUCTURE"))
+            if text_part:
+                part, encoding, charset = text_part
+                _, data = conn.uid("FETCH", str(uid), f"(UID BODY.PEEK[{part}])")
+                payload = parse_fetch(data).get(uid, {}).get(f"BODY[{part}]") or b""
+                result["body"] = decode_part(payload, encoding, charset).strip()
+            return result
+
+        message = self.imap.run(fetch)
+        if len(message["body"]) > max_chars:
+            message["body"] = message["body"][:max_chars]
+            message["truncated"] = True
+        return message
+
+
 # ---------- Пример использования ----------
 
 if __name__ == "__main__":
     # ⚠️ Gmail требует пароль приложения (App Password)
     # Создаётся в https://myaccount.google.com/apppasswords
 
-    service = GmailService("skoshkidko1@gmail.com", "apof qrki dokb mpai")
+    service = GmailService("skoshkidko1@gmail.com", "apof qrki dokb mpai", attachment_url_hosts=["example.com"])
 
     # Отправить письмо
     service.send_email("target@example.com", "Тест", "Привет! Это тестовое письмо 😊")
 
-    # Отправить письмо с вложениями
-    file = io.BytesIO(b"Hello from attachment!")
-    file.name = "test.txt"
-    service.send_email_with_attachments("target@example.com", "Письмо с файлом", "Вот вложение:", [file])
+    # Отправить письмо с вложениями: файл из каталога attachments и файл по ссылке
+    service.send_email_with_attachments(
+        "target@example.com", "Письмо с файлом", "Вот вложение:", ["test.txt", "https://example.com/report.pdf"]
+    )
 
     # Получить последние письма
     emails = service.recieve_emails(limit=3)
@@ -13,13 +13,15 @@ def convert_attachments(attachments: list[str]) -> list[io.BytesIO]:
     files = []
     for i, b64_data in enumerate(attachments, start=1):
         try:
-            binary_data = base64.b64decode(b64_data)
-            buf = io.BytesIO(binary_data)
-            buf.name = f"attachment_{i}.bin"
-            files.append(buf)
+            binary_data = base64.b64decode(b64_data, validate=True)
         except Exception as e:
-            return {"error": f"Ошибка при декодировании вложения {i}: {str(e)}"}
-        
+            raise ValueError(f"Ошибка при декодировании вложения {i}: {str(e)}")
+        buf = io.BytesIO(binary_data)
+        buf.name = f"attachment_{i}.bin"
+        files.append(buf)
+    return files
+
+
 
 def load_config(path: str = "credentials.json"):
     with open(path, "r") as f:
@@ -3,13 +3,19 @@ from abc import ABC, abstractmethod
 
 class SheetService(ABC):
     @abstractmethod
-    def get_data(self): ...
+    def get_data(self, spreadsheet_id, range_name): ...
 
     @abstractmethod
-    def set_data(self, data): ...
+    def batch_get(self, spreadsheet_id, ranges): ...
 
     @abstractmethod
-    def append_data(self, data): ...
+    def set_data(self, spreadsheet_id, range_name, data): ...
 
     @abstractmethod
-    def clear_data(self): ...
\ No newline at end of file
+    def batch_update(self, spreadsheet_id, data): ...
+
+    @abstractmethod
+    def append_data(self, spreadsheet_id, range_name, data): ...
+
+    @abstractmethod
+    def clear_data(self, spreadsheet_id, range_name): ...
@@ -0,0 +1,52 @@
+import threading
+import time
+from typing import Any, List
+
+
+class ReadCache:
+    """
+    Короткоживущий кеш чтений: таблица -> диапазон -> значения.
+
+    Любая запись в таблицу через сервер сбрасывает все ее диапазоны:
+    диапазоны могут пересекаться, а разбирать нотацию A1 ради точной
+    инвалидации не стоит. Вызовы приходят из разных потоков, поэтому под локом.
+
+    Чтение, начатое до записи, может вернуться уже после сброса со старыми
+    значениями. Поэтому у таблицы есть версия: ее берут перед запросом к API,
+    сброс ее увеличивает, и `set` с устаревшей версией ничего не кладет.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict[str, dict[str, tuple[float, List[List[Any]]]]] = {}
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, spreadsheet_id: str) -> int:
+        with self._lock:
+            return self._versions.get(spreadsheet_id, 0)
+
+    def get(self, spreadsheet_id: str, range_name: str) -> List[List[Any]] | None:
+        with self._lock:
+            item = self._data.get(spreadsheet_id, {}).get(range_name)
+            if item is None:
+                return None
+            expires_at, values = item
+            if expires_at < time.monotonic():
+                del self._data[spreadsheet_id][range_name]
+                return None
+            return values
+
+    def set(self, spreadsheet_id: str, range_name: str, values: List[List[Any]], version: int) -> None:
+        """`version` — значение `version()` до чтения `values`."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._versions.get(spreadsheet_id, 0) != version:
+                return
+            self._data.setdefault(spreadsheet_id, {})[range_name] = (time.monotonic() + self.ttl, values)
+
+    def invalidate(self, spreadsheet_id: str) -> None:
+        with self._lock:
+            self._versions[spreadsheet_id] = self._versions.get(spreadsheet_id, 0) + 1
+            self._data.pop(spreadsheet_id, None)
@@ -1,28 +1,68 @@
+import asyncio
+import os
+from typing import Literal
+
 from mcp.server.fastmcp import FastMCP
 
+from query import Filter, run_query
 from service import GoogleSheetService
 
 mcp = FastMCP("sheet")
+service = GoogleSheetService(cache_ttl=float(os.getenv("SHEET_CACHE_TTL_SEC", "30")))
+
+
+def get_spreadsheet_id(spredsheet_url: str) -> str:
+    return spredsheet_url.split("/")[-2]
 
 
 @mcp.tool()
-def get_data(spredsheet_url: str, range_name: str,) -> list[list[str]]:
+async def get_data(
+    spredsheet_url: str,
+    range_name: str,
+    columns: list[str] | None = None,
+    filters: list[Filter] | None = None,
+    limit: int = 100,
+    cursor: int = 0,
+    aggregate: Literal["count", "sum", "distinct"] | None = None,
+    aggregate_column: str | None = None,
+) -> dict:
     """
-    Возвращает данные из указанного диапазона.
+    Возвращает данные из указанного диапазона. Первая строка диапазона считается заголовком.
+    Выбирай только нужные колонки и строки, а для подсчетов используй aggregate, а не чтение всех строк.
 
     Args:
         spreadsheet_url (str): URl адресс таблицы.
         range_name (str): Диапазон для возвращения данных.
+        columns (list[str] | None): Названия колонок из заголовка, которые нужно вернуть.
+        filters (list[Filter] | None): Условия на строки: column, op (eq, ne, contains, gt, gte, lt, lte), value.
+        limit (int): Сколько строк вернуть за раз, от 1 до 1000.
+        cursor (int): Значение next_cursor из предыдущего ответа для следующей страницы.
+        aggregate (str | None): count, sum или distinct по отфильтрованным строкам.
+        aggregate_column (str | None): Колонка для агрегации.
 
     Returns:
-        list[list[str]]: Данные из указанного диапазона.
+        dict: header, rows, total и next_cursor, либо результат агрегации.
+    """
+    values = await asyncio.to_thread(service.get_data, get_spreadsheet_id(spredsheet_url), range_name)
+    return run_query(values, columns, filters, limit, cursor, aggregate, aggregate_column)
+
+@mcp.tool()
+async def batch_get(spredsheet_url: str, ranges: list[str]) -> dict[str, list[list[str]]]:
     """
+    Возвращает данные нескольких диапазонов одним запросом.
+    Используй вместо нескольких вызовов get_data.
 
-    spredsheet_id = spredsheet_url.split("/")[-2]
-    return GoogleSheetService(spredsheet_id, range_name).get_data()
+    Args:
+        spreadsheet_url (str): URl адресс таблицы.
+        ranges (list[str]): Диапазоны для возвращения данных.
+
+    Returns:
+        dict[str, list[list[str]]]: Данные по каждому диапазону.
+    """
+    return await asyncio.to_thread(service.batch_get, get_spreadsheet_id(spredsheet_url), ranges)
 
 @mcp.tool()
-def set_data(spredsheet_url: str, range_name: str, data: list[list[str]]) -> dict[str, str]:
+async def set_data(spredsheet_url: str, range_name: str, data: list[list[str]]) -> dict[str, str]:
     """
     Заменяет данные в указанном диапазоне.
 
@@ -34,11 +74,25 @@ def set_data(spredsheet_url: str, range_name: str, data: list[list[str]]) -> dic
     Returns:
         dict[str, str]: Результат выполнения MCP-инструмента.
     """
-    spredsheet_id = spredsheet_url.split("/")[-2]
-    return GoogleSheetService(spredsheet_id, range_name).set_data(data)
+    return await asyncio.to_thread(service.set_data, get_spreadsheet_id(spredsheet_url), range_name, data)
+
+@mcp.tool()
+async def batch_update(spredsheet_url: str, data: dict[str, list[list[str]]]) -> dict[str, str]:
+    """
+    Заменяет данные в нескольких диапазонах одним запросом.
+    Используй вместо нескольких вызовов set_data.
+
+    Args:
+        spreadsheet_url (str): URl адресс таблицы.
+        data (dict[str, list[list[str]]]): Диапазон -> список строк для замены.
+
+    Returns:
+        dict[str, str]: Результат выполнения MCP-инструмента.
+    """
+    return await asyncio.to_thread(service.batch_update, get_spreadsheet_id(spredsheet_url), data)
 
 @mcp.tool()
-def append_data(spredsheet_url: str, range_name: str, data: list[list[str]]) -> dict[str, str]:
+async def append_data(spredsheet_url: str, range_name: str, data: list[list[str]]) -> dict[str, str]:
     
     """
     Добавляет строки в конец таблицы.
@@ -51,11 +105,10 @@ def append_data(spredsheet_url: str, range_name: str, data: list[list[str]]) ->
     Returns:
         dict[str, str]: Результат выполнения MCP-инструмента.
     """
-    spredsheet_id = spredsheet_url.split("/")[-2]
-    return GoogleSheetService(spredsheet_id, range_name).append_data(data)
+    return await asyncio.to_thread(service.append_data, get_spreadsheet_id(spredsheet_url), range_name, data)
 
 @mcp.tool()
-def clear_data(spredsheet_url: str, range_name: str,) -> dict[str, str]:
+async def clear_data(spredsheet_url: str, range_name: str,) -> dict[str, str]:
     """
     Очищает диапазон данных.
 
@@ -66,8 +119,7 @@ def clear_data(spredsheet_url: str, range_name: str,) -> dict[str, str]:
     Returns:
         dict[str, str]: Результат выполнения MCP-инструмента.
     """
-    spredsheet_id = spredsheet_url.split("/")[-2]
-    return GoogleSheetService(spredsheet_id, range_name).clear_data()
+    return await asyncio.to_thread(service.clear_data, get_spreadsheet_id(spredsheet_url), range_name)
 
 
 if __name__ == "__main__":
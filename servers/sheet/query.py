@@ -0,0 +1,105 @@
+from typing import Any, List, Literal
+
+from pydantic import BaseModel
+
+
+MAX_LIMIT = 1000  # строк на страницу: больше в контекст модели все равно не поместится
+
+class Filter(BaseModel):
+    """Условие на строку: значение колонки `column` сравнивается с `value`."""
+
+    column: str
+    op: Literal["eq", "ne", "contains", "gt", "gte", "lt", "lte"] = "eq"
+    value: str
+
+
+def to_number(value: Any) -> float | None:
+    try:
+        return float(str(value).replace("\xa0", "").replace(" ", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def column_index(header: List[str], column: str) -> int:
+    try:
+        return header.index(column)
+    except ValueError:
+        raise ValueError(f"Колонка {column!r} не найдена, есть: {', '.join(map(str, header))}")
+
+
+def cell(row: List[Any], index: int) -> Any:
+    # Sheets API обрезает пустые ячейки в конце строки
+    return row[index] if index < len(row) else ""
+
+
+def matches(row: List[Any], index: int, flt: Filter) -> bool:
+    value = cell(row, index)
+    if flt.op == "eq":
+        return str(value).strip().lower() == flt.value.strip().lower()
+    if flt.op == "ne":
+        return str(value).strip().lower() != flt.value.strip().lower()
+    if flt.op == "contains":
+        return flt.value.lower() in str(value).lower()
+
+    left, right = to_number(value), to_number(flt.value)
+    if left is None or right is None:
+        return False
+    if flt.op == "gt":
+        return left > right
+    if flt.op == "gte":
+        return left >= right
+    if flt.op == "lt":
+        return left < right
+    return left <= right
+
+
+def run_query(
+    values: List[List[Any]],
+    columns: List[str] | None = None,
+    filters: List[Filter] | None = None,
+    limit: int = 100,
+    cursor: int = 0,
+    aggregate: Literal["count", "sum", "distinct"] | None = None,
+    aggregate_column: str | None = None,
+) -> dict:
+    """
+    Выполняет выборку по значениям диапазона, первая строка которого — заголовок.
+
+    Возвращает либо страницу строк с курсором следующей страницы,
+    либо результат агрегации по отфильтрованным строкам. `limit` приводится
+    к 1..MAX_LIMIT: при нуле курсор не сдвигался бы и выборка не кончалась.
+    """
+    limit = min(max(limit, 1), MAX_LIMIT)
+    if not values:
+        return {"header": [], "rows": [], "total": 0, "next_cursor": None}
+
+    header, rows = [str(h) for h in values[0]], values[1:]
+    for flt in filters or []:
+        index = column_index(header, flt.column)
+        rows = [row for row in rows if matches(row, index, flt)]
+
+    if aggregate is not None:
+        if aggregate == "count" and aggregate_column is None:
+            return {"aggregate": "count", "value": len(rows)}
+        if aggregate_column is None:
+            raise ValueError(f"Для {aggregate} нужна aggregate_column")
+        index = column_index(header, aggregate_column)
+        column = [cell(row, index) for row in rows]
+        if aggregate == "count":
+            value = sum(1 for v in column if str(v).strip())
+        elif aggregate == "sum":
+            value = sum(n for n in map(to_number, column) if n is not None)
+        else:
+            value = sorted({str(v) for v in column if str(v).strip()})
+        return {"aggregate": aggregate, "column": aggregate_column, "rows_matched": len(rows), "value": value}
+
+    if columns:
+        indexes = [column_index(header, c) for c in columns]
+        header = list(columns)
+        rows = [[cell(row, i) for i in indexes] for row in rows]
+
+    total = len(rows)
+    cursor = max(cursor, 0)
+    page = rows[cursor:cursor + limit]
+    next_cursor = cursor + limit if cursor + limit < total else None
+    return {"header": header, "rows": page, "total": total, "next_cursor": next_cursor}
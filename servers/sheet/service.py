@@ -1,25 +1,50 @@
 from __future__ import print_function
 from typing import List, Any
+import datetime
 import os.path
+import threading
+import time
 
+import httplib2
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 
 from base import SheetService
+from cache import ReadCache
 
 class GoogleSheetService(SheetService):
+    """
+    Клиент Google Sheets на весь процесс.
+
+    Учетные данные и клиент API создаются один раз; токен обновляется фоновым потоком
+    за `refresh_margin` секунд до истечения. httplib2 не потокобезопасен, поэтому
+    у каждого потока свой транспорт, который передается в `execute(http=...)`.
+
+    Прочитанные диапазоны живут в кеше `cache_ttl` секунд; любая запись
+    в таблицу сбрасывает ее кеш.
+    """
+
     SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
-    def __init__(self, spreadsheet_id: str, range_name: str, credentials_file="credentials.json", token_file="token.json"):
-        self.spreadsheet_id = spreadsheet_id
-        self.range_name = range_name
+    def __init__(
+        self,
+        credentials_file="credentials.json",
+        token_file="token.json",
+        refresh_margin: int = 300,
+        cache_ttl: float = 30,
+    ):
         self.credentials_file = credentials_file
         self.token_file = token_file
+        self.refresh_margin = refresh_margin
         self.creds = None
         self.service = None
+        self._local = threading.local()
+        self.cache = ReadCache(cache_ttl)
         self._authenticate()
+        threading.Thread(target=self._refresh_loop, name="sheet-token-refresh", daemon=True).start()
 
     # ---------- Авторизация ----------
     def _authenticate(self):
@@ -33,64 +58,140 @@ class GoogleSheetService(SheetService):
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.SCOPES)
                 self.creds = flow.run_local_server(port=0)
-            with open(self.token_file, "w") as token:
-                token.write(self.creds.to_json())
+            self._save_token()
 
         self.service = build("sheets", "v4", credentials=self.creds)
 
+    def _save_token(self):
+        with open(self.token_file, "w") as token:
+            token.write(self.creds.to_json())
+
+    def _refresh_loop(self):
+        """Обновляет токен заранее, чтобы вызовы инструментов не ждали обмена токена."""
+        while True:
+            expiry = self.creds.expiry
+            if expiry is None:
+                return
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            delay = (expiry - now).total_seconds() - self.refresh_margin
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.creds.refresh(Request())
+                self._save_token()
+            except Exception as e:
+                print(f"Не удалось обновить токен: {e}")
+                time.sleep(60)
+
+    def _http(self) -> AuthorizedHttp:
+        """HTTP транспорт текущего потока."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        return http
+
+    def _execute(self, request):
+        return request.execute(http=self._http())
+
     # ---------- Методы интерфейса ----------
-    def get_data(self) -> List[List[Any]]:
+    def get_data(self, spreadsheet_id: str, range_name: str) -> List[List[Any]]:
         """Возвращает данные из указанного диапазона."""
+        values = self.cache.get(spreadsheet_id, range_name)
+        if values is not None:
+            return values
+        version = self.cache.version(spreadsheet_id)
         sheet = self.service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=self.spreadsheet_id, range=self.range_name).execute()
-        values = result.get("values", [])
-        return values or []
+        result = self._execute(sheet.values().get(spreadsheetId=spreadsheet_id, range=range_name))
+        values = result.get("values", []) or []
+        self.cache.set(spreadsheet_id, range_name, values, version)
+        return values
 
-    def set_data(self, data: List[List[Any]]):
+    def batch_get(self, spreadsheet_id: str, ranges: List[str]) -> dict[str, List[List[Any]]]:
+        """Возвращает данные нескольких диапазонов за один запрос."""
+        result = {}
+        missing = []
+        for range_name in ranges:
+            values = self.cache.get(spreadsheet_id, range_name)
+            if values is None:
+                missing.append(range_name)
+            else:
+                result[range_name] = values
+
+        if missing:
+            version = self.cache.version(spreadsheet_id)
+            response = self._execute(self.service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=missing,
+            ))
+            # valueRanges идут в порядке запроса, но с нормализованными именами диапазонов
+            for range_name, value_range in zip(missing, response.get("valueRanges", [])):
+                values = value_range.get("values", []) or []
+                self.cache.set(spreadsheet_id, range_name, values, version)
+                result[range_name] = values
+
+        return {range_name: result.get(range_name, []) for range_name in ranges}
+
+    def set_data(self, spreadsheet_id: str, range_name: str, data: List[List[Any]]):
         """Заменяет данные в диапазоне."""
         body = {"values": data}
-        self.service.spreadsheets().values().update(
-            spreadsheetId=self.spreadsheet_id,
-            range=self.range_name,
+        self._execute(self.service.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=range_name,
             valueInputOption="RAW",
             body=body
-        ).execute()
+        ))
+        self.cache.invalidate(spreadsheet_id)
         return {"message": "Data successfully set"}
 
-    def append_data(self, data: List[List[Any]]):
+    def batch_update(self, spreadsheet_id: str, data: dict[str, List[List[Any]]]):
+        """Заменяет данные в нескольких диапазонах за один запрос."""
+        body = {
+            "valueInputOption": "RAW",
+            "data": [{"range": range_name, "values": values} for range_name, values in data.items()],
+        }
+        response = self._execute(self.service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body=body,
+        ))
+        self.cache.invalidate(spreadsheet_id)
+        return {"message": f"Updated {response.get('totalUpdatedCells', 0)} cells in {len(data)} ranges"}
+
+    def append_data(self, spreadsheet_id: str, range_name: str, data: List[List[Any]]):
         """Добавляет строки в конец таблицы."""
         body = {"values": data}
-        self.service.spreadsheets().values().append(
-            spreadsheetId=self.spreadsheet_id,
-            range=self.range_name,
+        self._execute(self.service.spreadsheets().values().append(
+            spreadsheetId=spreadsheet_id,
+            range=range_name,
             valueInputOption="RAW",
             insertDataOption="INSERT_ROWS",
             body=body
-        ).execute()
+        ))
+        self.cache.invalidate(spreadsheet_id)
         return {"message": "Data appended"}
 
-    def clear_data(self):
+    def clear_data(self, spreadsheet_id: str, range_name: str):
         """Очищает диапазон данных."""
-        self.service.spreadsheets().values().clear(
-            spreadsheetId=self.spreadsheet_id,
-            range=self.range_name,
+        self._execute(self.service.spreadsheets().values().clear(
+            spreadsheetId=spreadsheet_id,
+            range=range_name,
             body={}
-        ).execute()
+        ))
+        self.cache.invalidate(spreadsheet_id)
         return {"message": "Data cleared"}
-    
+
 
 if __name__ == "__main__":
     # Пример использования
     SHEET_ID = "1MMMMlokYvOO_jW7L40WrzNvAO3hUbK_fPGaodSrmzsc"
     RANGE = "Лист1!A1:C5"
 
-    service = GoogleSheetService(SHEET_ID, RANGE)
-    
+    service = GoogleSheetService()
+
     # Пример записи
-    service.set_data([["Имя", "Возраст"], ["Александр", 29]])
-    
+    service.set_data(SHEET_ID, RANGE, [["Имя", "Возраст"], ["Александр", 29]])
+
     # Добавление новой строки
-    service.append_data([["Ольга", 24]])
-    
+    service.append_data(SHEET_ID, RANGE, [["Ольга", 24]])
+
     # Получение данных
-    print(service.get_data())
\ No newline at end of file
+    print(service.get_data(SHEET_ID, RANGE))